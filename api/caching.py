@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, update, insert, event
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.models import TableVersion
+
+# Tables whose changes are tracked for conditional GETs. Only read-mostly
+# tables are listed: every write bumps a single row, which would contend on
+# high-churn tables such as incidents or ping_failures.
+VERSIONED_TABLES = {"services", "admins", "service_admins"}
+
+# How long table versions may be served from memory instead of re-read from
+# the database (0: read them on every request). Writes made through this
+# process invalidate them immediately; writes from other instances are seen
+# after at most this many seconds.
+VERSION_CACHE_TTL = float(os.environ.get("API_VERSION_CACHE_TTL", 0))
+# Rendered response bodies kept per URL and reused while their ETag matches
+RESPONSE_CACHE_SIZE = int(os.environ.get("API_RESPONSE_CACHE_SIZE", 256))
+
+
+# -----------------------------
+# Version tracking
+# -----------------------------
+
+def _upsert(dialect: str):
+    if dialect == "postgresql":
+        return pg_insert
+    if dialect == "sqlite":
+        return sqlite_insert
+    return None
+
+
+def bump_versions(connection, tables: set[str]):
+    """
+    Increments the version of each table, creating missing counters.
+    """
+    now = datetime.now(timezone.utc)
+    versions = TableVersion.__table__
+    upsert = _upsert(connection.dialect.name)
+
+    if upsert is not None:
+        stmt = upsert(versions).values([
+            {"table_name": t, "version": 1, "updated_at": now} for t in sorted(tables)
+        ])
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=["table_name"],
+            set_={"version": versions.c.version + 1, "updated_at": stmt.excluded.updated_at},
+        ))
+        return
+
+    for table in sorted(tables):
+        result = connection.execute(
+            update(versions)
+            .where(versions.c.table_name == table)
+            .values(version=versions.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(versions).values(table_name=table, version=1, updated_at=now))
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_flushed_tables(session, flush_context):
+    changed = {
+        obj.__table__.name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if hasattr(obj, "__table__") and (obj not in session.dirty or session.is_modified(obj))
+    } & VERSIONED_TABLES
+    if changed:
+        bump_versions(session.connection(), changed)
+        session.info.setdefault("changed_tables", set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_tables(session):
+    changed = session.info.pop("changed_tables", None)
+    if changed:
+        version_cache.invalidate(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_tables(session):
+    session.info.pop("changed_tables", None)
+
+
+class VersionCache:
+    """
+    Table versions kept in memory for `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float = VERSION_CACHE_TTL):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, tables: tuple[str, ...]) -> dict | None:
+        if self.ttl <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entries = [self._data.get(t) for t in tables]
+        if any(e is None or e[1] <= now for e in entries):
+            return None
+        return {t: e[0] for t, e in zip(tables, entries)}
+
+    def set(self, versions: dict):
+        if self.ttl <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for table, value in versions.items():
+                self._data[table] = (value, expires_at)
+
+    def invalidate(self, tables):
+        with self._lock:
+            for table in tables:
+                self._data.pop(table, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+version_cache = VersionCache()
+
+
+def _versions_query(tables: tuple[str, ...]):
+    return select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at).where(
+        TableVersion.table_name.in_(tables)
+    )
+
+
+def _collect(tables: tuple[str, ...], rows) -> dict:
+    found = {row.table_name: (row.version, row.updated_at) for row in rows}
+    versions = {t: found.get(t, (0, None)) for t in tables}
+    version_cache.set(versions)
+    return versions
+
+
+def table_versions(db: Session, *tables: str) -> dict:
+    """
+    {table: (version, updated_at)} for the given tables.
+    """
+    return version_cache.get(tables) or _collect(tables, db.execute(_versions_query(tables)))
+
+
+async def async_table_versions(db: AsyncSession, *tables: str) -> dict:
+    return version_cache.get(tables) or _collect(tables, await db.execute(_versions_query(tables)))
+
+
+# -----------------------------
+# Conditional responses
+# -----------------------------
+
+class ConditionalCache:
+    """
+    ETag / Last-Modified handling for endpoints whose output depends only on
+    a few versioned tables.
+
+    `lookup` answers 304 when the client's If-None-Match is current, or
+    replays the rendered body if this URL was served at the current ETag;
+    otherwise the endpoint builds its data and hands it to `store`.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(request: Request) -> str:
+        return str(request.url.path) + "?" + str(request.url.query)
+
+    def _validators(self, request: Request, versions: dict) -> dict:
+        digest = hashlib.sha1(
+            json.dumps([self._key(request), sorted((t, v) for t, (v, _) in versions.items())]).encode()
+        ).hexdigest()
+        headers = {"ETag": f'W/"{digest}"', "Cache-Control": "no-cache"}
+
+        modified = [ts for _, ts in versions.values() if ts is not None]
+        if modified:
+            last = max(ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc) for ts in modified)
+            headers["Last-Modified"] = format_datetime(last, usegmt=True)
+        return headers
+
+    def lookup(self, request: Request, versions: dict) -> Response | None:
+        headers = self._validators(request, versions)
+        etag = headers["ETag"]
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+
+        with self._lock:
+            cached = self._bodies.get(self._key(request))
+            if cached is not None and cached[0] == etag:
+                self._bodies.move_to_end(self._key(request))
+                return Response(cached[1], media_type="application/json", headers={**cached[2], **headers})
+        return None
+
+    def store(self, request: Request, versions: dict, data, headers: dict | None = None) -> Response:
+        validators = self._validators(request, versions)
+        body = json.dumps(jsonable_encoder(data)).encode()
+        extra = dict(headers or {})
+
+        if self.maxsize > 0:
+            with self._lock:
+                self._bodies[self._key(request)] = (validators["ETag"], body, extra)
+                self._bodies.move_to_end(self._key(request))
+                while len(self._bodies) > self.maxsize:
+                    self._bodies.popitem(last=False)
+
+        return Response(body, media_type="application/json", headers={**extra, **validators})
+
+    def clear(self):
+        with self._lock:
+            self._bodies.clear()
+
+
+http_cache = ConditionalCache()
@@ -1,18 +1,141 @@
 import os
-from sqlalchemy import create_engine
+import time
+import bisect
+import threading
+from sqlalchemy import create_engine, make_url, URL, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 
 SQLALCHEMY_DATABASE_URL = os.environ.get('db_url', '')
 
+# Connection pool of the async engine, which serves the monitoring and
+# notification hot path
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+# Smaller pool for the sync engine (admin CRUD and UI reads). Each API instance
+# can hold DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_SYNC_POOL_SIZE +
+# DB_SYNC_MAX_OVERFLOW connections; size the sum against the Cloud SQL
+# connection limit divided by the maximum number of instances.
+DB_SYNC_POOL_SIZE = int(os.environ.get('DB_SYNC_POOL_SIZE', 2))
+DB_SYNC_MAX_OVERFLOW = int(os.environ.get('DB_SYNC_MAX_OVERFLOW', 3))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+# Pre-ping costs a round-trip per checkout; recycling alone is often enough
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+# Behind PgBouncer (transaction pooling) connections are not pooled locally and
+# asyncpg's prepared statement caches are disabled
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true'
+
+# asyncio drivers used for each sync dialect
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+# Upper bounds (seconds) of the checkout latency histogram buckets
+CHECKOUT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def async_database_url(url: str | URL) -> URL:
+    """
+    Converts a sync database URL (e.g. postgresql+psycopg2://...) into the
+    equivalent URL for its asyncio driver.
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {parsed.drivername}")
+    return parsed.set(drivername=driver)
+
+
+def pool_options(is_async: bool = False) -> dict:
+    """
+    Engine keyword arguments for the configured pooling policy.
+    """
+    if DB_PGBOUNCER:
+        options = {"poolclass": NullPool}
+        if is_async:
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+
+    return {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_size": DB_POOL_SIZE if is_async else DB_SYNC_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW if is_async else DB_SYNC_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+class PoolMetrics:
+    """
+    Connection pool instrumentation for one engine: current pool occupancy
+    plus a histogram of how long sessions waited to check out a connection.
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.buckets = [0] * (len(CHECKOUT_BUCKETS) + 1)
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.connections_created = 0
+
+        if engine is not None:
+            event.listen(engine, "connect", self._on_connect)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connections_created += 1
+
+    def observe_checkout(self, seconds: float):
+        with self._lock:
+            self.buckets[bisect.bisect_left(CHECKOUT_BUCKETS, seconds)] += 1
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool if self.engine is not None else None
+        stats = {"pool": type(pool).__name__ if pool else None}
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)()
+
+        with self._lock:
+            labels = [f"le_{b}" for b in CHECKOUT_BUCKETS] + ["le_inf"]
+            stats.update({
+                "connections_created": self.connections_created,
+                "checkouts": self.checkouts,
+                "avg_checkout_seconds": self.total_wait / self.checkouts if self.checkouts else 0.0,
+                "max_checkout_seconds": self.max_wait,
+                "checkout_histogram": dict(zip(labels, self.buckets)),
+            })
+        return stats
+
+
 if SQLALCHEMY_DATABASE_URL:
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
-        pool_pre_ping=True,
-    )
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool_options())
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+    async_engine = create_async_engine(
+        async_database_url(SQLALCHEMY_DATABASE_URL),
+        **pool_options(is_async=True)
+    )
+    # expire_on_commit=False: objects are serialized after commit, and an
+    # AsyncSession cannot lazily reload expired attributes
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    pool_metrics = PoolMetrics(engine)
+    async_pool_metrics = PoolMetrics(async_engine.sync_engine)
 else:
     engine = None
+    async_engine = None
+    pool_metrics = PoolMetrics()
+    async_pool_metrics = PoolMetrics()
 
 
 def get_db():
@@ -22,6 +145,22 @@ def get_db():
     """
     db = SessionLocal()
     try:
+        # Check out the connection up front so the wait is measured
+        start = time.perf_counter()
+        db.connection()
+        pool_metrics.observe_checkout(time.perf_counter() - start)
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Provides a SQLAlchemy AsyncSession for the high-traffic async endpoints.
+    Use this with FastAPI Depends(get_async_db)
+    """
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        await db.connection()
+        async_pool_metrics.observe_checkout(time.perf_counter() - start)
+        yield db
@@ -1,16 +1,21 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone, timedelta
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import insert, update, select, func, case, literal, cast, and_, or_, DateTime, String
+from sqlalchemy.orm import Session, selectinload, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
 import jwt
 from jwt import ExpiredSignatureError, InvalidTokenError
 import os
 from pydantic import BaseModel
 
-from api.db import get_db, engine
+from api.db import get_db, get_async_db, engine, pool_metrics, async_pool_metrics
+from api.pagination import page_limit, decode_cursor, after_desc, paginate, NEXT_CURSOR_HEADER
+from api.caching import http_cache, table_versions, async_table_versions
 from utils.models import Base
-from api.schemas import ServiceCreate, ServiceEdit, AdminContactUpdate, ServiceAdminCreate, ServiceAdminUpdate, AdminCreate, ServiceOut, AdminOut, ContactAttemptCreate, AckRequest, ContactAttemptOut
+from api.schemas import ServiceCreate, ServiceEdit, AdminContactUpdate, ServiceAdminCreate, ServiceAdminUpdate, AdminCreate, ServiceOut, AdminOut, ContactAttemptCreate, AckRequest, ContactAttemptOut, CheckBatch, IncidentTransition, ServiceClaim, IncidentContext, DashboardService
 from utils.models import Service, Admin, ServiceAdmin, Incident, PingFailure, ContactAttempt
+from utils.sharding import owns
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -25,6 +30,21 @@ app = FastAPI(title="Monitoring API", lifespan=lifespan)
 
 JWT_SECRET = os.environ.get('jwt_secret', 'test-secret-key')
 
+# Columns projected straight into AdminOut, without loading Admin objects
+ADMIN_COLUMNS = (Admin.id, Admin.name, Admin.contact_type, Admin.contact_value)
+
+# Rows read per page when collecting a shard's due services
+CLAIM_SCAN_PAGE_SIZE = 1000
+
+
+def utcnow() -> datetime:
+    """
+    Current UTC time as a naive datetime, for the TIMESTAMP WITHOUT TIME ZONE
+    columns (next_at, ended_at, attempted_at, response_at). asyncpg refuses
+    to bind timezone-aware values to them.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
 # -----------------------------
 # Services
@@ -38,7 +58,7 @@ def add_service(service: ServiceCreate, db: Session = Depends(get_db)):
         frequency_seconds=service.frequency_seconds,
         alerting_window_npings=service.alerting_window_npings,
         failure_threshold=service.failure_threshold,
-        next_at=datetime.now(timezone.utc).replace(microsecond=0) + timedelta(minutes=1)
+        next_at=utcnow().replace(microsecond=0) + timedelta(minutes=1)
     )
     db.add(new_service)
     db.commit()
@@ -46,30 +66,144 @@ def add_service(service: ServiceCreate, db: Session = Depends(get_db)):
     return {"status": "service added", "service_id": new_service.id}
 
 
+def _check_shard(shard_index: int, shard_count: int):
+    if shard_index >= shard_count:
+        raise HTTPException(status_code=422, detail="shard_index must be in [0, shard_count)")
+
+
+@app.get("/services", response_model=list[ServiceOut])
+async def list_services(
+    request: Request,
+    shard_index: int = Query(0, ge=0),
+    shard_count: int = Query(1, ge=1),
+    db: AsyncSession = Depends(get_async_db),
+):
+    _check_shard(shard_index, shard_count)
+    versions = await async_table_versions(db, "services")
+    cached = http_cache.lookup(request, versions)
+    if cached is not None:
+        return cached
+
+    stmt = select(Service).order_by(Service.id)
+    if shard_count == 1:
+        services = (await db.scalars(stmt)).all()
+    else:
+        # Only ids are read for the whole table; the shard's rows are loaded
+        # in chunks that stay under the driver's bind parameter limit
+        ids = [i for i in await db.scalars(select(Service.id).order_by(Service.id))
+               if owns(i, shard_index, shard_count)]
+        services = []
+        for i in range(0, len(ids), CLAIM_SCAN_PAGE_SIZE):
+            services.extend(await db.scalars(stmt.where(Service.id.in_(ids[i:i + CLAIM_SCAN_PAGE_SIZE]))))
+    data = [ServiceOut.model_validate(s) for s in services]
+    return http_cache.store(request, versions, data)
+
+
+def _add_seconds(db: AsyncSession, timestamp: datetime, seconds):
+    """
+    SQL expression for `timestamp + seconds`, where seconds may be a column.
+    """
+    if db.bind.dialect.name == "sqlite":
+        return func.datetime(literal(timestamp, DateTime), "+" + cast(seconds, String) + " seconds")
+    return literal(timestamp, DateTime) + literal(timedelta(seconds=1)) * seconds
+
+
+async def _claim_due_services(db: AsyncSession, limit: int | None, shard_index: int = 0, shard_count: int = 1):
+    """
+    Claims up to `limit` due services and moves their next_at forward.
+
+    Due rows are selected with FOR UPDATE SKIP LOCKED, so concurrent workers
+    claim disjoint sets instead of waiting on each other, and rescheduled with
+    a single UPDATE ... RETURNING.
+
+    With more than one shard only the services the consistent hash ring assigns
+    to `shard_index` are claimed. Due ids are read page by page in next_at
+    order until `limit` of them belong to the shard; the UPDATE then locks
+    those rows with SKIP LOCKED and re-checks next_at, so overlapping runs of
+    the same shard still claim disjoint sets.
+    """
+    now = utcnow().replace(microsecond=0)
+
+    due = (
+        select(Service.id)
+        .where(Service.next_at <= now)
+        .order_by(Service.next_at)
+    )
+    if shard_count > 1:
+        claimed = await _shard_candidates(db, now, limit, shard_index, shard_count)
+        if not claimed:
+            await db.commit()
+            return []
+        locked = (
+            select(Service.id)
+            .where(Service.id.in_(claimed), Service.next_at <= now)
+            .with_for_update(skip_locked=True)
+        )
+    else:
+        locked = due.limit(limit).with_for_update(skip_locked=True)
+
+    services = (await db.execute(
+        update(Service.__table__)
+        .where(Service.id.in_(locked.scalar_subquery()))
+        .values(next_at=_add_seconds(db, now, Service.frequency_seconds))
+        .returning(*Service.__table__.c)
+    )).all()
+
+    await db.commit()
+    return services
+
+
+async def _shard_candidates(db: AsyncSession, now: datetime, limit: int | None,
+                            shard_index: int, shard_count: int) -> list[int]:
+    """
+    Up to `limit` due service ids owned by the shard, earliest first. Pages
+    are sized so that one page usually holds the shard's share.
+    """
+    page_size = min((limit or CLAIM_SCAN_PAGE_SIZE) * shard_count, CLAIM_SCAN_PAGE_SIZE)
+    claimed = []
+    last = None
+    while limit is None or len(claimed) < limit:
+        page = select(Service.id, Service.next_at).where(Service.next_at <= now)
+        if last is not None:
+            page = page.where(or_(
+                Service.next_at > last.next_at,
+                and_(Service.next_at == last.next_at, Service.id > last.id),
+            ))
+        rows = (await db.execute(page.order_by(Service.next_at, Service.id).limit(page_size))).all()
+        claimed.extend(r.id for r in rows if owns(r.id, shard_index, shard_count))
+        if len(rows) < page_size:
+            break
+        last = rows[-1]
+    return claimed[:limit]
+
+
 @app.get("/services/due", response_model=list[ServiceOut])
-def get_due_services(db: Session = Depends(get_db)):
-    now = datetime.now(timezone.utc).replace(microsecond=0)
+async def get_due_services(limit: int | None = None, db: AsyncSession = Depends(get_async_db)):
+    return await _claim_due_services(db, limit)
 
-    services = (
-        db.query(Service)
-        .filter(Service.next_at <= now)
-        .with_for_update()
-        .all()
-    )
-    for svc in services:
-        svc.next_at = now + timedelta(seconds=svc.frequency_seconds)
 
-    db.commit()
+@app.post("/services/claim", response_model=list[ServiceOut])
+async def claim_due_services(claim: ServiceClaim, db: AsyncSession = Depends(get_async_db)):
+    _check_shard(claim.shard_index, claim.shard_count)
+
+    services = await _claim_due_services(db, claim.limit, claim.shard_index, claim.shard_count)
+    if services:
+        print(f"Worker {claim.worker_id} claimed {len(services)} services")
     return services
 
 
-@app.get("/services/{service_id}")
-def get_service(service_id: int, db: Session = Depends(get_db)):
+@app.get("/services/{service_id}", response_model=ServiceOut)
+def get_service(service_id: int, request: Request, db: Session = Depends(get_db)):
+    versions = table_versions(db, "services")
+    cached = http_cache.lookup(request, versions)
+    if cached is not None:
+        return cached
+
     existing_service = db.query(Service).filter(Service.id == service_id).first()
     if not existing_service:
         raise HTTPException(status_code=404, detail="Service not found")
 
-    return existing_service
+    return http_cache.store(request, versions, ServiceOut.model_validate(existing_service))
 
 
 @app.put("/services/{service_id}")
@@ -123,11 +257,18 @@ def create_service_admin(service_id: int, admin_data: ServiceAdminCreate, db: Se
 
 
 @app.get("/services/{service_id}/admins", response_model=dict[str, AdminOut])
-def get_service_admin(service_id: int, db: Session = Depends(get_db)):
-
-    admins = db.query(ServiceAdmin).filter(ServiceAdmin.service_id == service_id).all()
-    admins = {a.role: db.query(Admin).filter(Admin.id == a.admin_id).first() for a in admins}
-    return admins
+def get_service_admin(service_id: int, request: Request, db: Session = Depends(get_db)):
+    versions = table_versions(db, "services", "admins", "service_admins")
+    cached = http_cache.lookup(request, versions)
+    if cached is not None:
+        return cached
+
+    rows = db.execute(
+        select(ServiceAdmin.role, *ADMIN_COLUMNS)
+        .join(Admin, Admin.id == ServiceAdmin.admin_id)
+        .where(ServiceAdmin.service_id == service_id)
+    ).all()
+    return http_cache.store(request, versions, {row.role: AdminOut.model_validate(row) for row in rows})
 
 
 @app.put("/services/{service_id}/admin")
@@ -202,8 +343,27 @@ def update_admin_contact(admin_id: int, update: AdminContactUpdate, db: Session
 
 
 @app.get("/admins/", response_model=list[AdminOut])
-def get_all_admins(db: Session = Depends(get_db)):
-    return db.query(Admin).all()
+def get_all_admins(
+    request: Request,
+    response: Response,
+    limit: int = Depends(page_limit),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    versions = table_versions(db, "admins")
+    cached = http_cache.lookup(request, versions)
+    if cached is not None:
+        return cached
+
+    q = db.query(Admin).order_by(Admin.id)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, int)
+        q = q.filter(Admin.id > last_id)
+    admins = paginate(q.limit(limit + 1).all(), limit, response, lambda a: (a.id,))
+
+    # Keep the next-page cursor with the cached body
+    headers = {k: v for k, v in response.headers.items() if k.lower() == NEXT_CURSOR_HEADER.lower()}
+    return http_cache.store(request, versions, [AdminOut.model_validate(a) for a in admins], headers)
 
 
 @app.get("/admins/contact/{value}", response_model=AdminOut)
@@ -216,7 +376,12 @@ def get_admin_by_contact(value: str, db: Session = Depends(get_db)):
 
 
 @app.get("/admins/{admin_id}/services", response_model=list[ServiceOut])
-def get_services_for_admin(admin_id: int, db: Session = Depends(get_db)):
+def get_services_for_admin(admin_id: int, request: Request, db: Session = Depends(get_db)):
+    versions = table_versions(db, "services", "admins", "service_admins")
+    cached = http_cache.lookup(request, versions)
+    if cached is not None:
+        return cached
+
     # Check if admin exists first (optional, but good for error handling)
     admin = db.query(Admin).filter(Admin.id == admin_id).first()
     if not admin:
@@ -229,88 +394,187 @@ def get_services_for_admin(admin_id: int, db: Session = Depends(get_db)):
         .filter(ServiceAdmin.admin_id == admin_id)
         .all()
     )
-    
-    return services
+
+    return http_cache.store(request, versions, [ServiceOut.model_validate(s) for s in services])
+
+
+@app.get("/admins/{admin_id}/dashboard", response_model=list[DashboardService])
+def get_admin_dashboard(admin_id: int, incident_limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db)):
+    """
+    Everything the UI dashboard shows for an admin: their services with both
+    admins, the latest `incident_limit` incidents per service and the contact
+    attempts for those incidents. Issues a fixed number of queries regardless
+    of how many services the admin has.
+    """
+    admin = db.query(Admin).filter(Admin.id == admin_id).first()
+    if not admin:
+        raise HTTPException(status_code=404, detail="Admin not found")
+
+    services = (
+        db.query(Service)
+        .join(ServiceAdmin)
+        .filter(ServiceAdmin.admin_id == admin_id)
+        .options(selectinload(Service.admins).joinedload(ServiceAdmin.admin))
+        .order_by(Service.id)
+        .all()
+    )
+    service_ids = [s.id for s in services]
+
+    # Latest incidents per service in one query
+    ranked = (
+        select(
+            Incident,
+            func.row_number().over(
+                partition_by=Incident.service_id,
+                order_by=(Incident.started_at.desc(), Incident.id.desc())
+            ).label("rn")
+        )
+        .where(Incident.service_id.in_(service_ids))
+        .subquery()
+    )
+    recent = aliased(Incident, ranked)
+    incidents = db.scalars(
+        select(recent).where(ranked.c.rn <= incident_limit).order_by(ranked.c.rn)
+    ).all()
+
+    attempts = db.execute(
+        select(
+            ContactAttempt.incident_id,
+            Admin.name.label("admin_name"),
+            ContactAttempt.channel,
+            ContactAttempt.attempted_at,
+            ContactAttempt.response_at,
+        )
+        .join(Admin, Admin.id == ContactAttempt.admin_id)
+        .where(ContactAttempt.incident_id.in_([i.id for i in incidents]))
+        .order_by(ContactAttempt.attempted_at.desc())
+    ).all()
+
+    incidents_by_service = {service_id: [] for service_id in service_ids}
+    service_of_incident = {}
+    for incident in incidents:
+        incidents_by_service[incident.service_id].append(incident)
+        service_of_incident[incident.id] = incident.service_id
+
+    attempts_by_service = {service_id: [] for service_id in service_ids}
+    for attempt in attempts:
+        attempts_by_service[service_of_incident[attempt.incident_id]].append(dict(attempt._mapping))
+
+    dashboard = []
+    for service in services:
+        item = ServiceOut.model_validate(service).model_dump()
+        item.update({sa.role: sa.admin for sa in service.admins})
+        item["incidents"] = incidents_by_service[service.id]
+        item["attempts"] = attempts_by_service[service.id]
+        dashboard.append(item)
+    return dashboard
 
 # -----------------------------
 # Incidents
 # -----------------------------
 
 @app.post("/services/{service_id}/incidents")
-def add_incident(service_id: int, db: Session = Depends(get_db)):
+async def add_incident(service_id: int, db: AsyncSession = Depends(get_async_db)):
     incident = Incident(service_id=service_id)
     db.add(incident)
-    db.commit()
-    db.refresh(incident)
+    await db.commit()
+    await db.refresh(incident)
     return incident
 
 @app.get("/services/{service_id}/incidents")
-def list_service_incidents(service_id: int, db: Session = Depends(get_db)):
-    return db.query(Incident).filter(Incident.service_id == service_id).all()
+def list_service_incidents(
+    service_id: int,
+    response: Response,
+    limit: int = Depends(page_limit),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Incidents of the service, newest first, optionally limited to those
+    started within [since, until). Next page cursor is in X-Next-Cursor.
+    """
+    q = db.query(Incident).filter(Incident.service_id == service_id)
+    if since:
+        q = q.filter(Incident.started_at >= since)
+    if until:
+        q = q.filter(Incident.started_at < until)
+    if cursor:
+        q = q.filter(after_desc(Incident.started_at, Incident.id, cursor))
+
+    rows = q.order_by(Incident.started_at.desc(), Incident.id.desc()).limit(limit + 1).all()
+    return paginate(rows, limit, response, lambda i: (i.started_at, i.id))
 
 
 @app.get("/services/{service_id}/incidents/open")
-def list_open_incidents_for_service(service_id: int, db: Session = Depends(get_db)):
-    return db.query(Incident).filter(
-        Incident.service_id == service_id,
-        Incident.status.in_(["registered", "acknowledged"])
-    ).all()
+async def list_open_incidents_for_service(service_id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(
+        select(Incident).where(
+            Incident.service_id == service_id,
+            Incident.status.in_(["registered", "acknowledged"])
+        )
+    )
+    return result.scalars().all()
 
 
 @app.patch("/incidents/{incident_id}/status")
-def update_incident_status(incident_id: int, status: str, db: Session = Depends(get_db)):
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+async def update_incident_status(incident_id: int, status: str, db: AsyncSession = Depends(get_async_db)):
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(404, "Incident not found")
 
     incident.status = status
-    db.commit()
-    db.refresh(incident)
+    await db.commit()
+    await db.refresh(incident)
     return incident
 
 
 @app.patch("/incidents/{incident_id}/resolve")
-def resolve_incident(incident_id: int, db: Session = Depends(get_db)):
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+async def resolve_incident(incident_id: int, db: AsyncSession = Depends(get_async_db)):
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(404, "Incident not found")
 
-    incident.ended_at = datetime.now(timezone.utc)
+    incident.ended_at = utcnow()
     incident.status = "resolved"
-    db.commit()
-    db.refresh(incident)
+    await db.commit()
+    await db.refresh(incident)
     return incident
 
 
-@app.get("/incidents/{incident_id}/admins")
-def get_incident_admins(incident_id: int, role: str | None = None, db: Session = Depends(get_db)):
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
-    if not incident:
-        raise HTTPException(404, "Incident not found")
-    q = (
-        db.query(Admin)
-        .join(ServiceAdmin, ServiceAdmin.admin_id == Admin.id)
-        .filter(ServiceAdmin.service_id == incident.service_id)
-    )
+@app.get("/incidents/{incident_id}/admins", response_model=list[AdminOut])
+async def get_incident_admins(incident_id: int, role: str | None = None, db: AsyncSession = Depends(get_async_db)):
+    # Outer joins from the incident: no rows means no incident, a row of
+    # NULLs means an incident whose service has no (matching) admins
+    on_service = ServiceAdmin.service_id == Incident.service_id
     if role:
-        q = q.filter(ServiceAdmin.role == role)
-    return q.all()
+        on_service = and_(on_service, ServiceAdmin.role == role)
+    rows = (await db.execute(
+        select(*ADMIN_COLUMNS)
+        .select_from(Incident)
+        .outerjoin(ServiceAdmin, on_service)
+        .outerjoin(Admin, Admin.id == ServiceAdmin.admin_id)
+        .where(Incident.id == incident_id)
+    )).all()
+    if not rows:
+        raise HTTPException(404, "Incident not found")
+    return [AdminOut.model_validate(row) for row in rows if row.id is not None]
 
 
 @app.get("/incidents/{incident_id}/notified-admins")
-def get_notified_admins(incident_id: int, db: Session = Depends(get_db)):
-    admins = (
-        db.query(Admin)
+async def get_notified_admins(incident_id: int, db: AsyncSession = Depends(get_async_db)):
+    admins = await db.scalars(
+        select(Admin)
         .join(ContactAttempt, ContactAttempt.admin_id == Admin.id)
-        .filter(ContactAttempt.incident_id == incident_id)
+        .where(ContactAttempt.incident_id == incident_id)
         .distinct()
-        .all()
     )
-    return admins
+    return admins.all()
 
 
 @app.post("/incidents/ack") 
-def acknowledge_incident(request: AckRequest, db: Session = Depends(get_db)):
+async def acknowledge_incident(request: AckRequest, db: AsyncSession = Depends(get_async_db)):
     token = request.token
     
     # Decode token
@@ -325,7 +589,7 @@ def acknowledge_incident(request: AckRequest, db: Session = Depends(get_db)):
     admin_id = payload["admin_id"]
 
     # Fetch incident
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
 
@@ -338,25 +602,55 @@ def acknowledge_incident(request: AckRequest, db: Session = Depends(get_db)):
 
     # Acknowledge incident
     incident.status = "acknowledged"
-    db.commit()
+    await db.commit()
 
     # Update contact attempt
-    attempt = db.query(ContactAttempt).filter(
-        ContactAttempt.incident_id == incident_id,
-        ContactAttempt.admin_id == admin_id
-    ).order_by(ContactAttempt.attempted_at.desc()).first()
+    attempt = await db.scalar(
+        select(ContactAttempt).where(
+            ContactAttempt.incident_id == incident_id,
+            ContactAttempt.admin_id == admin_id
+        ).order_by(ContactAttempt.attempted_at.desc()).limit(1)
+    )
 
     if attempt:
         attempt.result = "acknowledged"
-        attempt.response_at = datetime.now(timezone.utc)
-        db.commit()
+        attempt.response_at = utcnow()
+        await db.commit()
 
     return {"status": "acknowledged"}
 
 
+@app.get("/incidents/{incident_id}/context", response_model=IncidentContext)
+async def get_incident_context(incident_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Incident together with its service and the service's admins by role,
+    i.e. everything the notification service needs for one event.
+    """
+    row = (await db.execute(
+        select(Incident, Service)
+        .join(Service, Service.id == Incident.service_id)
+        .where(Incident.id == incident_id)
+    )).first()
+    if not row:
+        raise HTTPException(404, "Incident not found")
+    incident, service = row
+
+    admins = {"primary": [], "secondary": []}
+    rows = await db.execute(
+        select(Admin, ServiceAdmin.role)
+        .join(ServiceAdmin, ServiceAdmin.admin_id == Admin.id)
+        .where(ServiceAdmin.service_id == service.id)
+        .order_by(Admin.id)
+    )
+    for admin, role in rows:
+        admins[role].append(admin)
+
+    return {"incident": incident, "service": service, "admins": admins}
+
+
 @app.get("/incidents/{incident_id}")
-def get_incident(incident_id: int, db: Session = Depends(get_db)):
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+async def get_incident(incident_id: int, db: AsyncSession = Depends(get_async_db)):
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(404, "Incident not found")
     return incident
@@ -367,23 +661,72 @@ def get_incident(incident_id: int, db: Session = Depends(get_db)):
 # -----------------------------
 
 @app.post("/services/{service_id}/failures")
-def record_ping_failure(service_id: int, db: Session = Depends(get_db)):
+async def record_ping_failure(service_id: int, db: AsyncSession = Depends(get_async_db)):
     failure = PingFailure(service_id=service_id)
     db.add(failure)
-    db.commit()
+    await db.commit()
     return {"status": "failure recorded"}
 
 
 @app.get("/services/{service_id}/failures/recent")
-def list_recent_failures(service_id: int, window_seconds: int, db: Session = Depends(get_db)):
+async def list_recent_failures(
+    service_id: int,
+    response: Response,
+    window_seconds: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = Depends(page_limit),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Failures of the service, newest first, within the last `window_seconds`
+    and/or [since, until). Next page cursor is in X-Next-Cursor.
+    """
+    stmt = select(PingFailure).where(PingFailure.service_id == service_id)
+    if window_seconds is not None:
+        stmt = stmt.where(PingFailure.failed_at >= datetime.now(timezone.utc) - timedelta(seconds=window_seconds))
+    if since:
+        stmt = stmt.where(PingFailure.failed_at >= since)
+    if until:
+        stmt = stmt.where(PingFailure.failed_at < until)
+    if cursor:
+        stmt = stmt.where(after_desc(PingFailure.failed_at, PingFailure.id, cursor))
+
+    result = await db.execute(
+        stmt.order_by(PingFailure.failed_at.desc(), PingFailure.id.desc()).limit(limit + 1)
+    )
+    return paginate(result.scalars().all(), limit, response, lambda f: (f.failed_at, f.id))
+
+
+@app.get("/services/{service_id}/failures/recent/count")
+async def count_recent_failures(service_id: int, window_seconds: int, db: AsyncSession = Depends(get_async_db)):
     cutoff = datetime.now(timezone.utc) - timedelta(seconds=window_seconds)
 
-    return (
-        db.query(PingFailure)
-        .filter(PingFailure.service_id == service_id)
-        .filter(PingFailure.failed_at >= cutoff)
-        .all()
+    count = await db.scalar(
+        select(func.count(PingFailure.id))
+        .where(PingFailure.service_id == service_id)
+        .where(PingFailure.failed_at >= cutoff)
     )
+    return {"service_id": service_id, "count": count}
+
+
+@app.get("/failures/recent/count", response_model=dict[int, int])
+async def count_recent_failures_for_services(
+    window_seconds: int,
+    service_ids: list[int] = Query(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=window_seconds)
+
+    result = await db.execute(
+        select(PingFailure.service_id, func.count(PingFailure.id))
+        .where(PingFailure.service_id.in_(service_ids))
+        .where(PingFailure.failed_at >= cutoff)
+        .group_by(PingFailure.service_id)
+    )
+    counts = dict(result.all())
+    return {service_id: counts.get(service_id, 0) for service_id in service_ids}
 
 
 @app.delete("/failures/cleanup")
@@ -393,23 +736,108 @@ def cleanup_old_failures(db: Session = Depends(get_db)):
     db.commit()
     return {"deleted": deleted}
 
+# -----------------------------
+# Checks
+# -----------------------------
+
+@app.post("/checks/batch", response_model=list[IncidentTransition])
+async def ingest_check_batch(batch: CheckBatch, db: AsyncSession = Depends(get_async_db)):
+    """
+    Ingests the results of a whole monitoring cycle in one request.
+
+    Records all failures with a single multi-row insert, counts failures inside
+    each service's alerting window with one grouped query, then opens or resolves
+    incidents. Returns the incident state transitions that should be published.
+    """
+    now = datetime.now(timezone.utc)
+    results = {r.service_id: r for r in batch.results}
+    if not results:
+        return []
+
+    services = (await db.execute(select(Service).where(Service.id.in_(results)))).scalars().all()
+    if not services:
+        return []
+
+    failed = [{"service_id": s.id, "failed_at": now} for s in services if not results[s.id].success]
+    if failed:
+        await db.execute(insert(PingFailure), failed)
+
+    # Per-service window start, evaluated in a single GROUP BY query for
+    # the services whose threshold decision was not made by the caller
+    cutoffs = {
+        s.id: now - timedelta(seconds=s.alerting_window_npings * s.frequency_seconds)
+        for s in services
+        if results[s.id].should_trigger is None
+    }
+    counts = {}
+    if cutoffs:
+        result = await db.execute(
+            select(PingFailure.service_id, func.count(PingFailure.id))
+            .where(PingFailure.service_id.in_(cutoffs))
+            .where(PingFailure.failed_at >= case(
+                {sid: literal(cutoff, PingFailure.failed_at.type) for sid, cutoff in cutoffs.items()},
+                value=PingFailure.service_id,
+            ))
+            .group_by(PingFailure.service_id)
+        )
+        counts = dict(result.all())
+
+    open_incidents = {}
+    result = await db.execute(
+        select(Incident)
+        .where(
+            Incident.service_id.in_([s.id for s in services]),
+            Incident.status.in_(["registered", "acknowledged"])
+        )
+        .order_by(Incident.id)
+    )
+    for incident in result.scalars():
+        open_incidents.setdefault(incident.service_id, incident)
+
+    created = []
+    transitions = []
+    for svc in services:
+        should_trigger = results[svc.id].should_trigger
+        if should_trigger is None:
+            should_trigger = counts.get(svc.id, 0) >= svc.failure_threshold
+        incident = open_incidents.get(svc.id)
+
+        if should_trigger and not incident:
+            created.append(Incident(service_id=svc.id))
+
+        if not should_trigger and incident:
+            incident.ended_at = now.replace(tzinfo=None)
+            incident.status = "resolved"
+            transitions.append(
+                {"type": "RESOLVE_INCIDENT", "service_id": svc.id, "incident_id": incident.id}
+            )
+
+    db.add_all(created)
+    await db.flush()
+    transitions.extend(
+        {"type": "CREATE_INCIDENT", "service_id": i.service_id, "incident_id": i.id}
+        for i in created
+    )
+    await db.commit()
+
+    return transitions
+
 # -----------------------------
 # Contact attempts
 # -----------------------------
 
 @app.post("/contact_attempts/")
-def add_contact_attempt(contact_attempt: ContactAttemptCreate, db: Session = Depends(get_db)):
+async def add_contact_attempt(contact_attempt: ContactAttemptCreate, db: AsyncSession = Depends(get_async_db)):
     new_attempt = ContactAttempt(
         incident_id=contact_attempt.incident_id,
         admin_id=contact_attempt.admin_id,
         channel=contact_attempt.channel,
-        attempted_at=datetime.now(timezone.utc),
+        attempted_at=utcnow(),
         result=None,
         response_at=None
     )
     db.add(new_attempt)
-    db.commit()
-    db.refresh(new_attempt)
+    await db.commit()
 
     return {"status": "contact attempt added", "contact_attempt_id": new_attempt.id}
 
@@ -420,23 +848,53 @@ def update_contact_attempt(attempt_id: int, result: str, db: Session = Depends(g
         raise HTTPException(404, "Contact attempt not found")
 
     attempt.result = result
-    attempt.response_at = datetime.now(timezone.utc)
+    attempt.response_at = utcnow()
     db.commit()
     db.refresh(attempt)
     return attempt
     c
 
 @app.get("/contact_attempts", response_model=list[ContactAttemptOut])
-def get_contact_attempts(service_id: int, db: Session = Depends(get_db)):
-    attempts = (
-        db.query(ContactAttempt)
-        .join(Incident)
-        .options(joinedload(ContactAttempt.admin)) 
-        .filter(Incident.service_id == service_id)
-        .all()
+def get_contact_attempts(
+    service_id: int,
+    response: Response,
+    limit: int = Depends(page_limit),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    stmt = (
+        select(
+            ContactAttempt.id,
+            ContactAttempt.incident_id,
+            Admin.name.label("admin_name"),
+            ContactAttempt.channel,
+            ContactAttempt.attempted_at,
+            ContactAttempt.response_at,
+        )
+        .join(Incident, Incident.id == ContactAttempt.incident_id)
+        .join(Admin, Admin.id == ContactAttempt.admin_id)
+        .where(Incident.service_id == service_id)
     )
+    if since:
+        stmt = stmt.where(ContactAttempt.attempted_at >= since)
+    if until:
+        stmt = stmt.where(ContactAttempt.attempted_at < until)
+    if cursor:
+        stmt = stmt.where(after_desc(ContactAttempt.attempted_at, ContactAttempt.id, cursor))
+
+    rows = db.execute(
+        stmt.order_by(ContactAttempt.attempted_at.desc(), ContactAttempt.id.desc()).limit(limit + 1)
+    ).all()
+    rows = paginate(rows, limit, response, lambda a: (a.attempted_at, a.id))
+    return [ContactAttemptOut.model_validate(row) for row in rows]
+
+
+# -----------------------------
+# Metrics
+# -----------------------------
 
-    for a in attempts:
-        a.admin_name = a.admin.name
-        
-    return attempts
+@app.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    return {"sync": pool_metrics.snapshot(), "async": async_pool_metrics.snapshot()}
@@ -0,0 +1,52 @@
+import json
+import base64
+from datetime import datetime
+from fastapi import HTTPException, Response, Query
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Response header carrying the cursor of the next page; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def page_limit(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)) -> int:
+    return limit
+
+
+def encode_cursor(*values) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str, *types) -> list:
+    """
+    Decodes a cursor into values of the given types (datetime or int).
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(types):
+            raise ValueError("cursor length")
+        return [datetime.fromisoformat(v) if t is datetime else t(v) for v, t in zip(values, types)]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_desc(column, id_column, cursor: str):
+    """
+    Keyset condition for rows after the cursor in (column DESC, id DESC) order.
+    """
+    value, last_id = decode_cursor(cursor, datetime, int)
+    return or_(column < value, and_(column == value, id_column < last_id))
+
+
+def paginate(rows: list, limit: int, response: Response, key) -> list:
+    """
+    Trims a result fetched with `limit + 1` rows to `limit` and, if there
+    was an extra row, sets the next-page cursor from the last returned row.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(rows[-1]))
+    return rows
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional, Literal
 
@@ -28,6 +28,13 @@ class ServiceOut(BaseModel):
         from_attributes = True
 
 
+class ServiceClaim(BaseModel):
+    worker_id: str
+    limit: int = Field(100, ge=1)
+    shard_index: int = Field(0, ge=0)
+    shard_count: int = Field(1, ge=1)
+
+
 class AdminCreate(BaseModel):
     name: str
     contact_type: str
@@ -63,6 +70,24 @@ class IncidentCreate(BaseModel):
     service_id: int
 
 
+class IncidentOut(BaseModel):
+    id: int
+    service_id: int
+    started_at: datetime
+    ended_at: datetime | None = None
+    status: str
+
+    class Config:
+        from_attributes = True
+
+
+class IncidentContext(BaseModel):
+    incident: IncidentOut
+    service: ServiceOut
+    # Admins of the incident's service keyed by role
+    admins: dict[str, list[AdminOut]]
+
+
 class IncidentUpdateStatus(BaseModel):
     status: str
 
@@ -87,5 +112,30 @@ class ContactAttemptOut(BaseModel):
     class Config:
         from_attributes = True
 
+class DashboardService(ServiceOut):
+    primary: Optional[AdminOut] = None
+    secondary: Optional[AdminOut] = None
+    # Most recent incidents first, and the contact attempts made for them
+    incidents: list[IncidentOut] = []
+    attempts: list[ContactAttemptOut] = []
+
+
 class AckRequest(BaseModel):
     token: str
+
+
+class CheckResult(BaseModel):
+    service_id: int
+    success: bool
+    # Threshold decision made by the monitoring engine, if it tracks one
+    should_trigger: Optional[bool] = None
+
+
+class CheckBatch(BaseModel):
+    results: list[CheckResult]
+
+
+class IncidentTransition(BaseModel):
+    type: Literal["CREATE_INCIDENT", "RESOLVE_INCIDENT"]
+    service_id: int
+    incident_id: int
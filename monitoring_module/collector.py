@@ -1,17 +1,44 @@
-import time
-import asyncio
-import json
 import httpx
-from google.cloud import pubsub_v1
 from utils.auth import get_headers_async
+from monitoring_module.failure_window import FailureWindow
+from utils.transport import EventTransport, PubSubTransport
+
 
 class IPStatusCollector:
 
-    def __init__(self, service: dict, api_base_url: str, pubsub_topic: str, publisher=None):
+    def __init__(
+        self,
+        service: dict,
+        api_base_url: str,
+        pubsub_topic: str,
+        publisher=None,
+        api_client: httpx.AsyncClient | None = None,
+        probe_client: httpx.AsyncClient | None = None,
+        failure_window: FailureWindow | None = None,
+    ):
         self.service = service
         self.api_base_url = api_base_url.rstrip("/")
         self.pubsub_topic = pubsub_topic
-        self.publisher = publisher or pubsub_v1.PublisherClient()
+        # Publishes are fire-and-forget; whoever owns the transport
+        # (normally MonitoringEngine) flushes it once per cycle. A bare
+        # Pub/Sub client is wrapped for backwards compatibility, and that
+        # wrapper is flushed by run_once.
+        self._owns_publisher = not isinstance(publisher, EventTransport)
+        if self._owns_publisher:
+            self.publisher = PubSubTransport(pubsub_topic, publisher)
+        else:
+            self.publisher = publisher
+
+        # Long-lived clients are normally injected by MonitoringEngine so that
+        # connections are pooled across collectors and check cycles. Clients
+        # created here are owned by the collector and closed by run_once.
+        self._owned_clients = []
+        self.api_client = api_client or self._own_client()
+        self.probe_client = probe_client or self._own_client()
+
+        # In-memory window of recent outcomes; when present the threshold
+        # decision is made locally instead of asking the API.
+        self.failure_window = failure_window
 
         self.alerting_window_seconds = (
             self.service["alerting_window_npings"]
@@ -19,28 +46,61 @@ class IPStatusCollector:
         )
 
     async def run_once(self):
+        try:
+            success = await self._perform_check()
+            if self.failure_window:
+                self.failure_window.record(success)
+
+            if not success:
+                await self._record_failure()
+
+            should_trigger = await self._should_trigger_incident()
+            open_incident = await self._get_open_incident()
+
+            if should_trigger and not open_incident:
+                incident = await self._create_incident()
+                await self._publish_incident(incident["id"])
+
+            if not should_trigger and open_incident:
+                await self._resolve_incident(open_incident["id"])
+
+        finally:
+            if self._owns_publisher:
+                await self.publisher.flush()
+            await self.aclose()
+
+    def _own_client(self) -> httpx.AsyncClient:
+        client = httpx.AsyncClient(timeout=5)
+        self._owned_clients.append(client)
+        return client
+
+    async def aclose(self):
+        """
+        Closes the HTTP clients the collector created itself.
+        """
+        for client in self._owned_clients:
+            await client.aclose()
+
+    async def check(self) -> dict:
+        """
+        Probes the service and returns the outcome in the shape expected
+        by the batch ingestion endpoint (POST /checks/batch).
+        """
         success = await self._perform_check()
+        result = {"service_id": self.service["id"], "success": success}
 
-        if not success:
-            await self._record_failure()
-
-        should_trigger = await self._should_trigger_incident()
-        open_incident = await self._get_open_incident()
-
-        if should_trigger and not open_incident:
-            incident = await self._create_incident()
-            await self._publish_incident(incident["id"])
+        if self.failure_window:
+            self.failure_window.record(success)
+            result["should_trigger"] = self.failure_window.should_trigger()
 
-        if not should_trigger and open_incident:
-            await self._resolve_incident(open_incident["id"])
+        return result
 
     # ------------------ Ping ------------------
 
     async def _perform_check(self) -> bool:
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                r = await client.get(f"{self.service['IP']}")
-                return r.status_code < 400
+            r = await self.probe_client.get(f"{self.service['IP']}")
+            return r.status_code < 400
         except Exception:
             return False
 
@@ -49,23 +109,22 @@ class IPStatusCollector:
     async def _record_failure(self):
         url = f"{self.api_base_url}/services/{self.service['id']}/failures"
         headers = await get_headers_async(self.api_base_url)
-        
-        async with httpx.AsyncClient() as client:
-            await client.post(url, headers=headers)
+        await self.api_client.post(url, headers=headers)
 
     async def _should_trigger_incident(self) -> bool:
-        url = f"{self.api_base_url}/services/{self.service['id']}/failures/recent"
+        if self.failure_window:
+            return self.failure_window.should_trigger()
+
+        url = f"{self.api_base_url}/services/{self.service['id']}/failures/recent/count"
         params = {"window_seconds": self.alerting_window_seconds}
         headers = await get_headers_async(self.api_base_url)
 
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, params=params, headers=headers)
-            if r.status_code != 200:
-                print(f"API Error in _should_trigger_incident: {r.status_code}")
-                return False
-                
-            failures = r.json()
-            return len(failures) >= self.service["failure_threshold"]
+        r = await self.api_client.get(url, params=params, headers=headers)
+        if r.status_code != 200:
+            print(f"API Error in _should_trigger_incident: {r.status_code}")
+            return False
+
+        return r.json()["count"] >= self.service["failure_threshold"]
 
     # ------------------ Incidents (API) ------------------
 
@@ -73,53 +132,33 @@ class IPStatusCollector:
         url = f"{self.api_base_url}/services/{self.service['id']}/incidents/open"
         headers = await get_headers_async(self.api_base_url)
 
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, headers=headers)
-            if r.status_code != 200:
-                return None
-            incidents = r.json()
-            return incidents[0] if incidents else None
+        r = await self.api_client.get(url, headers=headers)
+        if r.status_code != 200:
+            return None
+        incidents = r.json()
+        return incidents[0] if incidents else None
 
     async def _create_incident(self):
         url = f"{self.api_base_url}/services/{self.service['id']}/incidents"
         headers = await get_headers_async(self.api_base_url)
 
-        async with httpx.AsyncClient() as client:
-            r = await client.post(url, headers=headers)
-            return r.json()
+        r = await self.api_client.post(url, headers=headers)
+        return r.json()
 
     async def _resolve_incident(self, incident_id: int):
         # Resolve via API
         url = f"{self.api_base_url}/incidents/{incident_id}/resolve"
         headers = await get_headers_async(self.api_base_url)
 
-        async with httpx.AsyncClient() as client:
-            r = await client.patch(url, headers=headers)
-            resolved_incident = r.json()
+        r = await self.api_client.patch(url, headers=headers)
+        resolved_incident = r.json()
 
         # Send Pub/Sub notification
-        message = {
-            "type": "RESOLVE_INCIDENT",
-            "service_id": self.service["id"],
-            "incident_id": incident_id,
-            "timestamp": time.time(),
-        }
-        data = json.dumps(message).encode("utf-8")
-        future = self.publisher.publish(self.pubsub_topic, data)
-        await asyncio.wrap_future(future)
+        self.publisher.publish("RESOLVE_INCIDENT", self.service["id"], incident_id)
 
         return resolved_incident
 
     # ------------------ Pub/Sub ------------------
 
     async def _publish_incident(self, incident_id: int):
-        message = {
-            "type": "CREATE_INCIDENT",
-            "service_id": self.service["id"],
-            "incident_id": incident_id,
-            "timestamp": time.time(),
-        }
-
-        data = json.dumps(message).encode("utf-8")
-        future = self.publisher.publish(self.pubsub_topic, data)
-        await asyncio.wrap_future(future)
+        self.publisher.publish("CREATE_INCIDENT", self.service["id"], incident_id)
@@ -0,0 +1,119 @@
+import time
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+
+class ProbeExecutor:
+    """
+    Runs probes through a bounded queue served by a fixed pool of workers.
+
+    - at most `max_concurrency` probes run at once (one per worker),
+    - at most `per_host_limit` of them target the same host,
+    - `submit` blocks once `queue_size` probes are waiting (backpressure).
+
+    Workers never wait for a busy host: a probe whose host is at its limit is
+    parked, and handed to the next worker that finishes a probe for that
+    host, so one slow host cannot tie up the workers other hosts need.
+
+    Queue depth and time spent waiting in the queue are tracked for tuning.
+    """
+
+    def __init__(self, max_concurrency: int = 200, per_host_limit: int = 10, queue_size: int = 1000):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.queue: asyncio.Queue | None = None
+        self.queue_size = queue_size
+
+        # Probes running per host, and probes parked until their host frees up
+        self._host_active: dict[str, int] = {}
+        self._deferred: dict[str, deque] = {}
+        self._waiting: asyncio.Semaphore | None = None
+        self._workers: list[asyncio.Task] = []
+
+        self.in_flight = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _start(self):
+        self.queue = asyncio.Queue()
+        self._waiting = asyncio.Semaphore(self.queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+
+    async def submit(self, host: str, probe: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Queues `probe` and returns its result once a worker has run it.
+        """
+        if not self._workers:
+            self._start()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._waiting.acquire()
+        self.queue.put_nowait((host, probe, future, time.monotonic()))
+        return await future
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            host = item[0]
+
+            if self._host_active.get(host, 0) >= self.per_host_limit:
+                self._deferred.setdefault(host, deque()).append(item)
+                continue
+
+            # Keep the host slot while probes for it are parked
+            self._host_active[host] = self._host_active.get(host, 0) + 1
+            try:
+                while item is not None:
+                    await self._run(item)
+                    item = self._next_deferred(host)
+            finally:
+                self._host_active[host] -= 1
+                if not self._host_active[host]:
+                    del self._host_active[host]
+
+    def _next_deferred(self, host: str):
+        deferred = self._deferred.get(host)
+        if not deferred:
+            return None
+        item = deferred.popleft()
+        if not deferred:
+            del self._deferred[host]
+        return item
+
+    async def _run(self, item):
+        _, probe, future, enqueued_at = item
+        self._waiting.release()
+
+        wait = time.monotonic() - enqueued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+        self.in_flight += 1
+        try:
+            result = await probe()
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        queued = self.queue.qsize() if self.queue else 0
+        return {
+            "queue_depth": queued + sum(len(d) for d in self._deferred.values()),
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "avg_wait_seconds": self.total_wait / self.completed if self.completed else 0.0,
+            "max_wait_seconds": self.max_wait,
+        }
+
+    async def aclose(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
@@ -0,0 +1,56 @@
+from collections import deque
+
+
+class FailureWindow:
+    """
+    Sliding window over the most recent check outcomes of a single service.
+
+    Outcomes are kept in a ring buffer sized by the service's
+    `alerting_window_npings`, together with a running failure count, so
+    deciding whether the failure threshold is reached is O(1).
+    """
+
+    def __init__(self, size: int, threshold: int):
+        self.size = max(size, 1)
+        self.threshold = threshold
+        self.outcomes = deque(maxlen=self.size)
+        self.failures = 0
+
+    @classmethod
+    def for_service(cls, service: dict) -> "FailureWindow":
+        return cls(service["alerting_window_npings"], service["failure_threshold"])
+
+    def record(self, success: bool):
+        # The oldest outcome falls out of the window once it is full
+        if len(self.outcomes) == self.size and not self.outcomes[0]:
+            self.failures -= 1
+
+        self.outcomes.append(success)
+        if not success:
+            self.failures += 1
+
+    def seed(self, failures: int):
+        """
+        Pre-fills the window with failures already recorded in the database.
+        """
+        for _ in range(min(failures, self.size)):
+            self.record(False)
+
+    def matches(self, service: dict) -> bool:
+        return (
+            self.size == max(service["alerting_window_npings"], 1)
+            and self.threshold == service["failure_threshold"]
+        )
+
+    def resized(self, service: dict) -> "FailureWindow":
+        """
+        Returns a window with the service's current settings, keeping
+        the most recent outcomes.
+        """
+        window = FailureWindow.for_service(service)
+        for success in self.outcomes:
+            window.record(success)
+        return window
+
+    def should_trigger(self) -> bool:
+        return self.failures >= self.threshold
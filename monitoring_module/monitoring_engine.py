@@ -1,59 +1,377 @@
 import os
+import time
+import socket
 import asyncio
 import httpx
-from google.cloud import pubsub_v1
-from collector import IPStatusCollector
+from urllib.parse import urlparse
+from monitoring_module.collector import IPStatusCollector
+from utils.transport import EVENT_TRANSPORT, EventTransport, create_transport
+from monitoring_module.failure_window import FailureWindow
+from monitoring_module.scheduler import CheckScheduler
+from monitoring_module.executor import ProbeExecutor
 from utils.auth import get_headers_async
 
+# "local" runs checks from an in-process scheduler, "poll" claims due services
+# from the API every POLL_INTERVAL seconds
+SCHEDULER_MODE = os.environ.get("SCHEDULER_MODE", "local")
+
 # Polling interval in seconds
 POLL_INTERVAL = 1
 
+# Local scheduler: how often service definitions are re-read from the API, and
+# the tick resolution used to group checks that are due at almost the same time
+SERVICE_SYNC_INTERVAL = float(os.environ.get("SERVICE_SYNC_INTERVAL", 60))
+SCHEDULER_RESOLUTION = 0.25
+
+# Maximum number of due services claimed per cycle
+CLAIM_LIMIT = int(os.environ.get("CLAIM_LIMIT", 500))
+
+# Sharding: each engine instance monitors a stable subset of services.
+# Cloud Run Jobs set CLOUD_RUN_TASK_INDEX/CLOUD_RUN_TASK_COUNT for every task.
+SHARD_INDEX = int(os.environ.get("SHARD_INDEX", os.environ.get("CLOUD_RUN_TASK_INDEX", 0)))
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", os.environ.get("CLOUD_RUN_TASK_COUNT", 1)))
+
+# How often (in seconds) connection pool and executor statistics are logged
+STATS_INTERVAL = 60
+
+# Connection pool settings, tunable per deployment
+API_MAX_CONNECTIONS = int(os.environ.get("API_MAX_CONNECTIONS", 50))
+PROBE_MAX_CONNECTIONS = int(os.environ.get("PROBE_MAX_CONNECTIONS", 500))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("MAX_KEEPALIVE_CONNECTIONS", 100))
+KEEPALIVE_EXPIRY = float(os.environ.get("KEEPALIVE_EXPIRY", 30))
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "true").lower() == "true"
+
+# Probe executor limits
+PROBE_CONCURRENCY = int(os.environ.get("PROBE_CONCURRENCY", 200))
+PROBE_PER_HOST_LIMIT = int(os.environ.get("PROBE_PER_HOST_LIMIT", 10))
+PROBE_QUEUE_SIZE = int(os.environ.get("PROBE_QUEUE_SIZE", 1000))
+
+
+def _pool_stats(client: httpx.AsyncClient) -> dict:
+    """
+    Summarises the state of the connection pool behind an httpx client.
+
+    The pool is not public httpx API, so anything unexpected yields {}
+    rather than failing the check cycle that logs it.
+    """
+    try:
+        pool = getattr(client._transport, "_pool", None)
+        if pool is None:
+            return {}
+
+        connections = list(pool.connections)
+        idle = sum(1 for c in connections if c.is_idle())
+        return {
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+            "http2": sum(1 for c in connections if "HTTP/2" in repr(c)),
+            "queued_requests": len(getattr(pool, "_requests", [])),
+        }
+    except Exception:
+        return {}
+
+
+def _host(service: dict) -> str:
+    """
+    Host a service's probes go to, used for per-host concurrency limits.
+    """
+    address = service["IP"]
+    return urlparse(address).hostname or address
+
 
 class MonitoringEngine:
 
-    def __init__(self, api_base_url: str, pubsub_topic: str):
+    def __init__(
+        self,
+        api_base_url: str,
+        pubsub_topic: str,
+        api_max_connections: int = API_MAX_CONNECTIONS,
+        probe_max_connections: int = PROBE_MAX_CONNECTIONS,
+        max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = KEEPALIVE_EXPIRY,
+        http2: bool = HTTP2_ENABLED,
+        worker_id: str | None = None,
+        claim_limit: int = CLAIM_LIMIT,
+        shard_index: int = SHARD_INDEX,
+        shard_count: int = SHARD_COUNT,
+        scheduler_mode: str = SCHEDULER_MODE,
+        sync_interval: float = SERVICE_SYNC_INTERVAL,
+        probe_concurrency: int = PROBE_CONCURRENCY,
+        probe_per_host_limit: int = PROBE_PER_HOST_LIMIT,
+        probe_queue_size: int = PROBE_QUEUE_SIZE,
+        transport: EventTransport | None = None,
+    ):
         self.api_base_url = api_base_url.rstrip("/")
         self.pubsub_topic = pubsub_topic
-        # Initialize Pub/Sub client
-        self.publisher = pubsub_v1.PublisherClient()
+        self.worker_id = worker_id or os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_limit = claim_limit
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        # Event transport shared by all collectors (Pub/Sub unless
+        # EVENT_TRANSPORT selects a local one)
+        self.publisher = transport or create_transport(topic=pubsub_topic)
+
+        # Long-lived HTTP clients shared by every collector: one for the API,
+        # one for the monitored targets.
+        self.api_client = httpx.AsyncClient(
+            timeout=5,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=api_max_connections,
+                max_keepalive_connections=min(max_keepalive_connections, api_max_connections),
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.probe_client = httpx.AsyncClient(
+            timeout=5,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=probe_max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.executor = ProbeExecutor(probe_concurrency, probe_per_host_limit, probe_queue_size)
+        self._last_stats_log = time.monotonic()
+
+        # Per-service sliding windows of recent check outcomes
+        self.windows: dict[int, FailureWindow] = {}
+
+        self.scheduler_mode = scheduler_mode
+        # Local windows see every check of a service only when this worker is
+        # its sole checker: with the local scheduler or a shard of its own.
+        # Workers sharing the due queue leave the threshold decision to the API.
+        self.local_windows = scheduler_mode != "poll" or shard_count > 1
+        self.sync_interval = sync_interval
+        self.scheduler = CheckScheduler()
+        self._in_flight: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    def pool_stats(self) -> dict:
+        """
+        Returns connection pool statistics for the API and probe clients.
+        """
+        return {
+            "api": _pool_stats(self.api_client),
+            "probe": _pool_stats(self.probe_client),
+        }
+
+    async def fetch_services(self):
+        """
+        Returns the definitions of every service owned by this worker's shard.
+        """
+        url = f"{self.api_base_url}/services"
+        params = {"shard_index": self.shard_index, "shard_count": self.shard_count}
+        headers = await get_headers_async(self.api_base_url)
+        r = await self.api_client.get(url, params=params, headers=headers)
+        r.raise_for_status()
+        return r.json()
 
     async def fetch_due_services(self):
-        url = f"{self.api_base_url}/services/due"
+        """
+        Claims a bounded batch of due services owned by this worker's shard.
+        Services claimed by other workers are skipped, not waited on.
+        """
+        url = f"{self.api_base_url}/services/claim"
+        payload = {
+            "worker_id": self.worker_id,
+            "limit": self.claim_limit,
+            "shard_index": self.shard_index,
+            "shard_count": self.shard_count,
+        }
+        headers = await get_headers_async(self.api_base_url)
+        r = await self.api_client.post(url, json=payload, headers=headers)
+        r.raise_for_status()
+        return r.json()
+
+    async def fetch_recent_failure_counts(self, services: list[dict]) -> dict[int, int]:
+        """
+        Returns the number of failures stored inside each service's alerting
+        window, with one request per distinct window length.
+        """
+        by_window = {}
+        for s in services:
+            window_seconds = s["alerting_window_npings"] * s["frequency_seconds"]
+            by_window.setdefault(window_seconds, []).append(s["id"])
+
+        url = f"{self.api_base_url}/failures/recent/count"
+        headers = await get_headers_async(self.api_base_url)
+
+        async def fetch(window_seconds, service_ids):
+            params = {"window_seconds": window_seconds, "service_ids": service_ids}
+            r = await self.api_client.get(url, params=params, headers=headers)
+            if r.status_code != 200:
+                print(f"API Error in fetch_recent_failure_counts: {r.status_code}")
+                return {}
+            return {int(k): v for k, v in r.json().items()}
+
+        counts = {}
+        for result in await asyncio.gather(*(fetch(w, ids) for w, ids in by_window.items())):
+            counts.update(result)
+        return counts
+
+    async def sync_windows(self, services: list[dict]):
+        """
+        Ensures every service has a failure window matching its settings.
+        Windows of services seen for the first time are seeded from the
+        failures already stored in the database.
+        """
+        new_services = []
+        for s in services:
+            window = self.windows.get(s["id"])
+            if window is None:
+                new_services.append(s)
+            elif not window.matches(s):
+                self.windows[s["id"]] = window.resized(s)
+
+        if not new_services:
+            return
+
+        counts = await self.fetch_recent_failure_counts(new_services)
+        for s in new_services:
+            window = FailureWindow.for_service(s)
+            window.seed(counts.get(s["id"], 0))
+            self.windows[s["id"]] = window
+
+    async def submit_results(self, results: list[dict]) -> list[dict]:
+        """
+        Sends all check results of one cycle to the API in a single request
+        and returns the incident transitions it decided on.
+        """
+        url = f"{self.api_base_url}/checks/batch"
         headers = await get_headers_async(self.api_base_url)
-        async with httpx.AsyncClient(timeout=5) as client:
-            r = await client.get(url, headers=headers)
-            r.raise_for_status()
-            return r.json()
+        r = await self.api_client.post(url, json={"results": results}, headers=headers)
+        r.raise_for_status()
+        return r.json()
+
+    async def publish_transitions(self, transitions: list[dict]):
+        """
+        Queues one event per transition; acks are awaited by `process`.
+        """
+        for t in transitions:
+            self.publisher.publish(t["type"], t["service_id"], t["incident_id"])
+
+    def _collector(self, service: dict) -> IPStatusCollector:
+        return IPStatusCollector(
+            service=service,
+            api_base_url=self.api_base_url,
+            pubsub_topic=self.pubsub_topic,
+            publisher=self.publisher,
+            api_client=self.api_client,
+            probe_client=self.probe_client,
+            failure_window=self.windows.get(service["id"]) if self.local_windows else None,
+        )
+
+    async def process(self, services: list[dict]):
+        """
+        Checks the given services and reports the results as one batch.
+        """
+        try:
+            if self.local_windows:
+                await self.sync_windows(services)
+            results = await asyncio.gather(*(
+                self.executor.submit(_host(s), self._collector(s).check) for s in services
+            ))
+            transitions = await self.submit_results(list(results))
+            await self.publish_transitions(transitions)
+
+        except Exception as e:
+            print("Monitoring loop error:", e)
+
+        finally:
+            await self.publisher.flush()
 
     async def run_once(self):
         try:
             services = await self.fetch_due_services()
-            tasks = [
-                IPStatusCollector(
-                    service=s,
-                    api_base_url=self.api_base_url,
-                    pubsub_topic=self.pubsub_topic,
-                    publisher=self.publisher,
-                ).run_once()
-                for s in services
-            ]
-
-            if tasks:
-                await asyncio.gather(*tasks)
-
         except Exception as e:
             print("Monitoring loop error:", e)
+            return
 
-    async def run(self):
+        if services:
+            await self.process(services)
+
+    async def sync_services(self):
+        services = await self.fetch_services()
+        self.scheduler.sync(services, time.monotonic())
+
+    def dispatch_due(self, now: float):
+        """
+        Starts checks for every service due at `now` without waiting for them,
+        so a slow target never delays the checks of other services. Services
+        whose previous check is still running are skipped for this run.
+        """
+        due = [s for s in self.scheduler.pop_due(now) if s["id"] not in self._in_flight]
+        if not due:
+            return
+
+        ids = {s["id"] for s in due}
+        self._in_flight |= ids
+
+        task = asyncio.create_task(self.process(due))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._in_flight.difference_update(ids))
+
+    def _log_stats(self):
+        if time.monotonic() - self._last_stats_log >= STATS_INTERVAL:
+            print("Connection pool stats:", self.pool_stats())
+            print("Probe executor stats:", self.executor.stats())
+            self._last_stats_log = time.monotonic()
+
+    async def run_scheduled(self):
+        """
+        Runs checks from the local scheduler. Service definitions are loaded
+        once and then refreshed every `sync_interval` seconds to pick up
+        configuration changes.
+        """
+        next_sync = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now >= next_sync:
+                try:
+                    await self.sync_services()
+                except Exception as e:
+                    print("Service sync error:", e)
+                next_sync = now + self.sync_interval
+
+            self.dispatch_due(now)
+            self._log_stats()
+
+            wake_at = min(next_sync, self.scheduler.next_due() or next_sync)
+            await asyncio.sleep(max(wake_at - time.monotonic(), SCHEDULER_RESOLUTION))
+
+    async def run_polling(self):
         while True:
             await self.run_once()
+            self._log_stats()
             await asyncio.sleep(POLL_INTERVAL)
 
+    async def run(self):
+        try:
+            if self.scheduler_mode == "poll":
+                await self.run_polling()
+            else:
+                await self.run_scheduled()
+        finally:
+            await self.aclose()
+
+    async def aclose(self):
+        await self.executor.aclose()
+        await self.api_client.aclose()
+        await self.probe_client.aclose()
+        self.publisher.close()
+
 
 if __name__ == "__main__":
     # Cloud Run Job env vars
     api_base_url = os.environ["API_BASE_URL"]
-    pubsub_topic = os.environ["PUBSUB_TOPIC"]
+    pubsub_topic = os.environ.get("PUBSUB_TOPIC")
+
+    if EVENT_TRANSPORT == "queue":
+        # Nothing in this process would read the queue
+        raise SystemExit("EVENT_TRANSPORT=queue runs in one process: python -m notification_module.local_runner")
 
     engine = MonitoringEngine(api_base_url, pubsub_topic)
     asyncio.run(engine.run())
@@ -0,0 +1,90 @@
+import heapq
+import random
+
+
+def _frequency(service: dict) -> float:
+    return max(service["frequency_seconds"], 1)
+
+
+class CheckScheduler:
+    """
+    Min-heap of upcoming checks, one entry per service.
+
+    Each service fires at its own `frequency_seconds` cadence. The next run is
+    computed from the previous *scheduled* time rather than from when the check
+    actually ran, so checks do not drift; if the engine falls behind, missed
+    runs are skipped instead of being fired in a burst.
+
+    Entries are invalidated lazily: rescheduling or removing a service bumps its
+    generation and stale heap entries are discarded when popped.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._services = {}
+        self._generations = {}
+
+    def __len__(self):
+        return len(self._services)
+
+    def sync(self, services: list[dict], now: float):
+        """
+        Replaces the scheduled service definitions. New services get a random
+        first run within one interval to spread load; services whose frequency
+        changed are rescheduled; services no longer present are dropped.
+        """
+        current = {s["id"]: s for s in services}
+
+        for service_id in list(self._services):
+            if service_id not in current:
+                self.remove(service_id)
+
+        for service_id, service in current.items():
+            existing = self._services.get(service_id)
+            self._services[service_id] = service
+
+            if existing is None:
+                self._push(service_id, now + random.uniform(0, _frequency(service)))
+            elif existing["frequency_seconds"] != service["frequency_seconds"]:
+                self._push(service_id, now + _frequency(service))
+
+    def remove(self, service_id: int):
+        self._services.pop(service_id, None)
+        self._generations[service_id] = self._generations.get(service_id, 0) + 1
+
+    def next_due(self) -> float | None:
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> list[dict]:
+        """
+        Returns every service whose check is due and schedules its next run.
+        """
+        due = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+
+            scheduled_at, service_id, _ = heapq.heappop(self._heap)
+            service = self._services[service_id]
+            due.append(service)
+
+            frequency = _frequency(service)
+            next_at = scheduled_at + frequency
+            if next_at <= now:
+                missed = int((now - scheduled_at) // frequency)
+                next_at = scheduled_at + (missed + 1) * frequency
+            self._push(service_id, next_at, bump=False)
+
+    def _push(self, service_id: int, at: float, bump: bool = True):
+        if bump:
+            self._generations[service_id] = self._generations.get(service_id, 0) + 1
+        heapq.heappush(self._heap, (at, service_id, self._generations[service_id]))
+
+    def _discard_stale(self):
+        while self._heap:
+            _, service_id, generation = self._heap[0]
+            if service_id in self._services and generation == self._generations[service_id]:
+                return
+            heapq.heappop(self._heap)
@@ -1,71 +1,132 @@
+import os
+import time
+import threading
+from collections import OrderedDict
 import requests
 from utils.auth import get_headers
+from utils.http import get_session
+
+# Incident contexts (incident, service, admins) are cached for this long;
+# incident status is always re-read for acknowledgement checks
+API_CACHE_TTL = float(os.environ.get("API_CACHE_TTL", 30))
+API_CACHE_SIZE = int(os.environ.get("API_CACHE_SIZE", 1024))
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int = API_CACHE_SIZE, ttl: float = API_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
 
 class NotificationApiClient:
-    def __init__(self, api_base_url: str):
+    def __init__(self, api_base_url: str, cache: TTLCache | None = None,
+                 session: requests.Session | None = None):
         self.api_base_url = api_base_url.rstrip("/")
+        self.cache = cache or TTLCache()
+        # Shared keep-alive session with timeouts and retries
+        self.session = session or get_session()
 
-    def get_incident(self, incident_id: int):
-        return requests.get(
-            f"{self.api_base_url}/incidents/{incident_id}",
-            headers=get_headers(self.api_base_url)
-        ).json()
+    def get_incident_context(self, incident_id: int, refresh: bool = False) -> dict | None:
+        """
+        Incident with its service and admins by role, fetched in one request
+        and cached. Returns None if the incident does not exist.
 
-    def get_admins_by_incident(self, incident_id: int, role: str):
-        return requests.get(
-            f"{self.api_base_url}/incidents/{incident_id}/admins",
-            params={"role": role},
-            headers=get_headers(self.api_base_url)
-        ).json()
+        Other error responses raise requests.HTTPError, so the event (or the
+        escalation check) fails and is retried; treating an API outage like
+        a deleted incident would mark it as acknowledged.
+        """
+        if not refresh:
+            context = self.cache.get(incident_id)
+            if context is not None:
+                return context
 
-    def get_service_name(self, incident_id: int):
-        # Get incident, to find service id
-        r_incident = requests.get(
-            f"{self.api_base_url}/incidents/{incident_id}",
+        r = self.session.get(
+            f"{self.api_base_url}/incidents/{incident_id}/context",
             headers=get_headers(self.api_base_url)
         )
-        
-        if r_incident.status_code != 200:
-            print(f"Failed to fetch incident {incident_id}: {r_incident.text}")
-            return "Unknown Service"
-            
-        incident_data = r_incident.json()
-        service_id = incident_data.get("service_id")
-        
-        if not service_id:
-            return "Unknown Service"
+        if r.status_code == 404:
+            self.cache.pop(incident_id)
+            return None
+        r.raise_for_status()
 
-        # Get service name by id
-        r_service = requests.get(
-            f"{self.api_base_url}/services/{service_id}",
-            headers=get_headers(self.api_base_url)
-        )
-        
-        if r_service.status_code != 200:
-            print(f"Failed to fetch service {service_id}: {r_service.text}")
+        context = r.json()
+        self.cache.set(incident_id, context)
+        return context
+
+    def invalidate(self, incident_id: int):
+        """
+        Drops the cached context, e.g. after the incident's status changed.
+        """
+        self.cache.pop(incident_id)
+
+    def get_incident(self, incident_id: int):
+        context = self.get_incident_context(incident_id)
+        return context["incident"] if context else None
+
+    def get_admins_by_incident(self, incident_id: int, role: str):
+        context = self.get_incident_context(incident_id)
+        if not context:
+            return []
+        return context["admins"].get(role, [])
+
+    def get_service_name(self, incident_id: int):
+        context = self.get_incident_context(incident_id)
+        if not context:
             return "Unknown Service"
-            
-        return r_service.json().get("name", "Unknown Service")
+        return context["service"].get("name", "Unknown Service")
 
     def is_acknowledged(self, incident_id: int) -> bool:
-        incident = self.get_incident(incident_id)
-        
+        context = self.get_incident_context(incident_id, refresh=True)
+
         # If incident is deleted, consider it acknowledged
-        if not incident or "status" not in incident:
-            return True 
-            
-        status = incident["status"]
+        if not context:
+            return True
+
+        status = context["incident"]["status"]
         return status in ["acknowledged", "resolved"]
 
     def add_contact_attempt(self, payload: dict):
-        requests.post(
+        self.session.post(
             f"{self.api_base_url}/contact_attempts/",
             json=payload,
             headers=get_headers(self.api_base_url)
         )
 
     def get_notified_admins(self, incident_id: int):
-        return requests.get(
+        return self.session.get(
             f"{self.api_base_url}/incidents/{incident_id}/notified-admins",
             headers=get_headers(self.api_base_url)
         ).json()
@@ -0,0 +1,265 @@
+import os
+import time
+import signal
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from google.cloud import pubsub_v1
+from notification_module.notification_engine import NotificationEngine
+from notification_module.api_client import NotificationApiClient
+from notification_module.mailer import Mailer
+from utils.transport import EVENT_TRANSPORT, create_transport, decode_event
+
+# Pull mode settings
+PUBSUB_SUBSCRIPTION = os.environ.get("PUBSUB_SUBSCRIPTION")
+PULL_MAX_MESSAGES = int(os.environ.get("PULL_MAX_MESSAGES", 500))
+PULL_WORKERS = int(os.environ.get("PULL_WORKERS", 16))
+PULL_IDLE_SLEEP = float(os.environ.get("PULL_IDLE_SLEEP", 1.0))
+# Until messages are acknowledged (after processing, or after their digest is
+# sent) their leases are extended to PULL_ACK_DEADLINE seconds every
+# PULL_LEASE_INTERVAL seconds; the interval must stay below the
+# subscription's ack_deadline_seconds (60 on alerting_pull in terraform) or
+# messages are redelivered, and emailed twice, before the first extension
+PULL_ACK_DEADLINE = int(os.environ.get("PULL_ACK_DEADLINE", 60))
+PULL_LEASE_INTERVAL = float(os.environ.get("PULL_LEASE_INTERVAL", 10))
+# Acknowledge requests are chunked to stay under the request size limit
+ACK_CHUNK_SIZE = 1000
+
+# -----------------------------
+# Event consumers
+# -----------------------------
+#
+# Alternatives to the Pub/Sub push endpoint in main.py. With EVENT_TRANSPORT
+# left at "pubsub" events are pulled from PUBSUB_SUBSCRIPTION in batches;
+# with "file" they are read from the shared file, so monitoring and
+# notification can run as two processes on one machine. The in-process
+# "queue" transport is served by local_runner instead.
+# Local transports default to ESCALATION_BACKEND=local; pulled events with
+# Cloud Tasks escalation need SERVICE_URL since there is no incoming request
+# to take the host from.
+
+
+def group_events(events: list[tuple[str, dict]]) -> list[tuple[list[str], list[dict]]]:
+    """
+    Groups (ack_id, event) pairs by incident, keeping arrival order within each
+    incident and dropping redelivered duplicates of the same event type.
+    Returns (ack_ids, events) per incident.
+    """
+    groups = {}
+    for ack_id, event in events:
+        ack_ids, incident_events = groups.setdefault(event.get("incident_id"), ([], []))
+        ack_ids.append(ack_id)
+        if all(e["type"] != event["type"] for e in incident_events):
+            incident_events.append(event)
+    return list(groups.values())
+
+
+class PullSubscriber:
+    """
+    Drains the incident subscription in batches.
+
+    Each pull receives up to `max_messages` events, which are grouped by
+    incident and handed to a pool of `workers` threads; one incident's events
+    are handled in order by a single worker. Messages of successfully handled
+    incidents are acknowledged in bulk, failed ones are nacked for redelivery.
+
+    Incidents queued for a digest are acknowledged (or nacked) when their
+    digest has been sent. Pulling carries on meanwhile, so later batches join
+    the open digest window; the leases of every message not yet acknowledged
+    are extended until then.
+    """
+
+    def __init__(
+        self,
+        engine: NotificationEngine,
+        subscription: str,
+        client=None,
+        max_messages: int = PULL_MAX_MESSAGES,
+        workers: int = PULL_WORKERS,
+        ack_deadline: int = PULL_ACK_DEADLINE,
+        lease_interval: float = PULL_LEASE_INTERVAL,
+    ):
+        self.engine = engine
+        self.subscription = subscription
+        self.client = client or pubsub_v1.SubscriberClient()
+        self.max_messages = max_messages
+        self.ack_deadline = ack_deadline
+        self.lease_interval = lease_interval
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+        # Ack ids whose leases are kept alive, per batch or pending digest
+        self._held: dict[object, list[str]] = {}
+        self._lock = threading.Lock()
+        self._extender: threading.Thread | None = None
+
+    def pull_once(self) -> int:
+        """
+        Pulls and processes one batch; returns the number of messages received.
+        Messages waiting on a digest are settled later, once it is sent.
+        """
+        response = self.client.pull(
+            subscription=self.subscription,
+            max_messages=self.max_messages,
+        )
+        received = response.received_messages
+        if not received:
+            return 0
+
+        events = []
+        # Undecodable messages would never succeed, so they are acked and dropped
+        ack_ids = []
+        for msg in received:
+            try:
+                events.append((msg.ack_id, decode_event(msg.message.data)))
+            except Exception as e:
+                print(f"Failed to decode message: {e}")
+                ack_ids.append(msg.ack_id)
+
+        nack_ids = []
+        groups = group_events(events)
+        batch = self._hold([ack_id for ack_id, _ in events])
+        try:
+            outcomes = list(self.pool.map(self._handle_group, groups))
+            for (group_ack_ids, _), pending in zip(groups, outcomes):
+                if pending is None:
+                    nack_ids.extend(group_ack_ids)
+                elif all(f.done() for f in pending):
+                    ok = all(f.exception() is None for f in pending)
+                    (ack_ids if ok else nack_ids).extend(group_ack_ids)
+                else:
+                    self._settle_when_sent(group_ack_ids, pending)
+        finally:
+            self._release(batch)
+
+        self._acknowledge(ack_ids)
+        self._nack(nack_ids)
+        return len(received)
+
+    def _handle_group(self, group: tuple[list[str], list[dict]]) -> list | None:
+        """
+        Handles one incident's events. Returns the deliveries still pending
+        (digests), or None if handling failed.
+        """
+        _, events = group
+        try:
+            pending = []
+            for event in events:
+                pending.extend(self.engine.handle_event(event) or [])
+            return pending
+        except Exception as e:
+            print(f"Failed to process events {events}: {e}")
+            return None
+
+    def _settle_when_sent(self, ack_ids: list[str], pending: list[Future]):
+        """
+        Keeps `ack_ids` leased until every delivery in `pending` is done, then
+        acknowledges them, or nacks them if a delivery failed.
+        """
+        token = self._hold(ack_ids)
+
+        def settle(_):
+            if not all(f.done() for f in pending) or not self._release(token):
+                return
+            try:
+                if all(f.exception() is None for f in pending):
+                    self._acknowledge(ack_ids)
+                else:
+                    self._nack(ack_ids)
+            except Exception as e:
+                print(f"Failed to settle messages {ack_ids}: {e}")
+
+        for f in pending:
+            f.add_done_callback(settle)
+
+    def _hold(self, ack_ids: list[str]) -> object:
+        """
+        Extends the ack deadline of `ack_ids` every `lease_interval` seconds
+        until the returned token is released.
+        """
+        token = object()
+        with self._lock:
+            self._held[token] = ack_ids
+            if self._extender is None:
+                self._extender = threading.Thread(target=self._extend_leases, daemon=True)
+                self._extender.start()
+        return token
+
+    def _release(self, token: object) -> bool:
+        """
+        Stops extending a hold; returns False if it was already released.
+        """
+        with self._lock:
+            return self._held.pop(token, None) is not None
+
+    def _extend_leases(self):
+        while True:
+            time.sleep(self.lease_interval)
+            with self._lock:
+                if not self._held:
+                    self._extender = None
+                    return
+                ack_ids = [ack_id for held in self._held.values() for ack_id in held]
+            try:
+                self._modify_ack_deadline(ack_ids, self.ack_deadline)
+            except Exception as e:
+                print(f"Failed to extend message leases: {e}")
+
+    def _acknowledge(self, ack_ids: list[str]):
+        for i in range(0, len(ack_ids), ACK_CHUNK_SIZE):
+            self.client.acknowledge(subscription=self.subscription, ack_ids=ack_ids[i:i + ACK_CHUNK_SIZE])
+
+    def _nack(self, ack_ids: list[str]):
+        self._modify_ack_deadline(ack_ids, 0)
+
+    def _modify_ack_deadline(self, ack_ids: list[str], seconds: int):
+        for i in range(0, len(ack_ids), ACK_CHUNK_SIZE):
+            self.client.modify_ack_deadline(
+                subscription=self.subscription,
+                ack_ids=ack_ids[i:i + ACK_CHUNK_SIZE],
+                ack_deadline_seconds=seconds,
+            )
+
+    def run(self, stop: threading.Event | None = None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                if self.pull_once():
+                    continue
+            except Exception as e:
+                print("Pull loop error:", e)
+            stop.wait(PULL_IDLE_SLEEP)
+
+
+def main():
+    if EVENT_TRANSPORT == "queue":
+        # The queue lives in the monitoring process; run both in one instead
+        raise SystemExit("EVENT_TRANSPORT=queue runs in one process: python -m notification_module.local_runner")
+
+    api_client = NotificationApiClient(api_base_url=os.environ.get("API_BASE_URL"))
+    engine = NotificationEngine(
+        api=api_client,
+        mailer=Mailer(),
+        esc_delay_seconds=300
+    )
+
+    if EVENT_TRANSPORT == "pubsub":
+        stop = threading.Event()
+
+        def shutdown(signum, frame):
+            # Send pending digests so the messages waiting on them are acked
+            engine.flush_digests()
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        PullSubscriber(engine, PUBSUB_SUBSCRIPTION).run(stop)
+        return
+
+    transport = create_transport()
+    try:
+        asyncio.run(transport.consume(engine.handle_event))
+    finally:
+        transport.close()
+
+
+if __name__ == "__main__":
+    main()
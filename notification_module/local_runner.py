@@ -0,0 +1,48 @@
+import os
+import asyncio
+from monitoring_module.monitoring_engine import MonitoringEngine
+from notification_module.notification_engine import NotificationEngine
+from notification_module.api_client import NotificationApiClient
+from notification_module.mailer import Mailer
+from utils.transport import QueueTransport
+
+# -----------------------------
+# Single-process alert path
+# -----------------------------
+#
+# Runs the monitoring engine and the notification engine in one event loop,
+# connected by a QueueTransport (EVENT_TRANSPORT=queue). Neither standalone
+# entrypoint accepts the queue transport, since its events never leave the
+# process that published them.
+
+
+async def run(monitoring: MonitoringEngine, notification: NotificationEngine, transport: QueueTransport):
+    """
+    Runs monitoring until it stops, handing every event it publishes to
+    `notification`. Events still queued when monitoring stops are handled
+    before returning.
+    """
+    stop = asyncio.Event()
+    consumer = asyncio.create_task(transport.consume(notification.handle_event, stop))
+    try:
+        await monitoring.run()
+    finally:
+        stop.set()
+        await consumer
+
+
+def main():
+    api_base_url = os.environ["API_BASE_URL"]
+    transport = QueueTransport()
+    monitoring = MonitoringEngine(api_base_url, pubsub_topic=None, transport=transport)
+    notification = NotificationEngine(
+        api=NotificationApiClient(api_base_url=api_base_url),
+        mailer=Mailer(),
+        esc_delay_seconds=300,
+        escalation_backend="local",
+    )
+    asyncio.run(run(monitoring, notification, transport))
+
+
+if __name__ == "__main__":
+    main()
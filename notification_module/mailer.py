@@ -1,36 +1,164 @@
 import os
+import time
+import queue
 import smtplib
+import threading
 from email.message import EmailMessage
 
+# Authenticated SMTP connections kept open and reused across sends
+SMTP_POOL_SIZE = int(os.environ.get("SMTP_POOL_SIZE", 4))
+# Idle connections older than this are dropped (servers close them anyway)
+SMTP_IDLE_TIMEOUT = float(os.environ.get("SMTP_IDLE_TIMEOUT", 60))
+# Connections are recycled after this many messages
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.environ.get("SMTP_MAX_MESSAGES_PER_CONNECTION", 100))
+SMTP_TIMEOUT = float(os.environ.get("SMTP_TIMEOUT", 10))
+
+# Rejections of a single message; the connection itself is still usable
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class _Connection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
 class Mailer:
-    def __init__(self, host=None, port=None, username=None, password=None, sender=None):
+    """
+    SMTP mailer with a small pool of authenticated connections.
+
+    Connections are opened lazily (EHLO, STARTTLS, EHLO, LOGIN once per
+    connection), reused across sends and threads, and replaced when the
+    server drops them: a send that fails on a reused connection is retried
+    once on a fresh one.
+    """
+
+    def __init__(self, host=None, port=None, username=None, password=None, sender=None,
+                 pool_size: int = SMTP_POOL_SIZE, idle_timeout: float = SMTP_IDLE_TIMEOUT,
+                 max_messages_per_connection: int = SMTP_MAX_MESSAGES_PER_CONNECTION):
         self.host = host or os.environ.get("SMTP_HOST")
         self.port = int(port or os.environ.get("SMTP_PORT", 587))
         self.username = username or os.environ.get("SMTP_USERNAME")
         self.password = password or os.environ.get("SMTP_PASSWORD")
         self.sender = sender or os.environ.get("SMTP_FROM")
 
+        self.idle_timeout = idle_timeout
+        self.max_messages_per_connection = max_messages_per_connection
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
     def send(self, to: str, subject: str, body: str) -> bool:
+        return self.send_many([(to, subject, body)])[0]
+
+    def send_many(self, messages: list[tuple[str, str, str]]) -> list[bool]:
+        """
+        Sends (to, subject, body) messages over a single pooled connection.
+        Returns whether each message was accepted.
+        """
+        results = []
+        with self._slots:
+            conn = None
+            for to, subject, body in messages:
+                msg = self._build(to, subject, body)
+                conn, ok = self._send_message(conn, msg)
+                results.append(ok)
+                if ok:
+                    print(f"Email sent successfully to {to}", flush=True)
+                else:
+                    print(f"Message to be sent: {body}")
+
+            if conn is not None:
+                self._release(conn)
+        return results
+
+    def _build(self, to: str, subject: str, body: str) -> EmailMessage:
+        msg = EmailMessage()
+        msg["From"] = self.sender
+        msg["To"] = to
+        msg["Subject"] = subject
+        msg.set_content(body)
+        return msg
+
+    def _send_message(self, conn: _Connection | None, msg: EmailMessage) -> tuple[_Connection | None, bool]:
+        """
+        Sends `msg`, reusing `conn` if given. If a reused connection turns out
+        to be broken it is discarded and the send retried once on a newly
+        opened one: other idle connections have usually timed out as well.
+        """
+        retry = False
+        for _ in range(2):
+            reused = conn is not None
+            try:
+                if conn is None:
+                    conn, reused = (self._connect(), False) if retry else self._acquire()
+                conn.server.send_message(msg)
+                conn.sent += 1
+                conn.last_used = time.monotonic()
+                return conn, True
+
+            except MESSAGE_ERRORS as e:
+                print(f"SMTP Error: {e}", flush=True)
+                return conn, False
+
+            except Exception as e:
+                print(f"SMTP Error: {e}", flush=True)
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                if not reused:
+                    break
+                retry = True
+
+        return None, False
+
+    def _acquire(self) -> tuple[_Connection, bool]:
+        """
+        Returns an idle connection if a fresh one is available, otherwise
+        opens a new one. The flag tells whether the connection was reused.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect(), False
+
+            if time.monotonic() - conn.last_used < self.idle_timeout:
+                return conn, True
+            conn.close()
+
+    def _release(self, conn: _Connection):
+        if conn.sent >= self.max_messages_per_connection:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    def _connect(self) -> _Connection:
+        print(f"Connecting to SMTP: {self.host}:{self.port} as {self.sender}...", flush=True)
+
+        server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
         try:
-            msg = EmailMessage()
-            msg["From"] = self.sender
-            msg["To"] = to
-            msg["Subject"] = subject
-            msg.set_content(body)
-
-            print(f"Connecting to SMTP: {self.host}:{self.port} as {self.sender}...", flush=True)
-
-            with smtplib.SMTP(self.host, self.port) as server:
-                server.ehlo()
-                server.starttls()
-                server.ehlo()
-                server.login(self.username, self.password)
-                server.send_message(msg)
-            
-            print(f"Email sent successfully to {to}", flush=True)
-            return True
-
-        except Exception as e:
-            print(f"SMTP Error: {e}", flush=True)
-            print(f"Message to be sent: {body}")
-            return False
\ No newline at end of file
+            server.ehlo()
+            server.starttls()
+            server.ehlo()
+            server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        return _Connection(server)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
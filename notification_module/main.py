@@ -19,6 +19,9 @@ engine = NotificationEngine(
     mailer=mailer,
     esc_delay_seconds=300
 )
+# Push deliveries are acked by the response, before a digest would be sent
+if engine.digest_window > 0:
+    raise RuntimeError("DIGEST_WINDOW_SECONDS requires pull delivery (notification_module.consumer)")
 
 # -----------------------------
 # Flask endpoints
@@ -1,16 +1,34 @@
 import json
 import jwt
 from google.cloud import tasks_v2
+from google.api_core.exceptions import AlreadyExists
 from datetime import datetime, timedelta, timezone
 from google.protobuf import timestamp_pb2
 import os
+import atexit
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from flask import request
 
-from notification_module.api_client import NotificationApiClient
+from notification_module.api_client import NotificationApiClient, TTLCache
 from notification_module.mailer import Mailer
+from utils.transport import EVENT_TRANSPORT
 
 
 JWT_SECRET = os.environ.get('jwt_secret', 'test-secret-key')
+# Upper bound on notifications (email + contact attempt + escalation) in flight
+# at once, shared by all incidents handled by this process
+NOTIFY_CONCURRENCY = int(os.environ.get('NOTIFY_CONCURRENCY', 16))
+# When > 0, new incidents are coalesced per admin for this many seconds and
+# sent as one digest email (0 sends one email per incident immediately).
+# Needs pull delivery: a push request would be acked before the digest is sent
+DIGEST_WINDOW_SECONDS = float(os.environ.get('DIGEST_WINDOW_SECONDS', 0))
+# "cloudtasks" schedules escalation checks as Cloud Tasks hitting /escalate;
+# "local" runs them in-process on a timer (single-node deployments). Defaults
+# to "local" when events do not come from Pub/Sub, i.e. off GCP
+ESCALATION_BACKEND = os.environ.get(
+    'ESCALATION_BACKEND', 'cloudtasks' if EVENT_TRANSPORT == 'pubsub' else 'local'
+)
 
 
 class NotificationEngine:
@@ -28,12 +46,20 @@ class NotificationEngine:
         project_id: GCP project ID for Cloud Tasks.
         location: GCP location for Cloud Tasks.
         queue: Cloud Tasks queue name.
+        pool: Thread pool notifying admins concurrently.
+        digest_window: Seconds new incidents are coalesced per admin (0 disables).
+        escalation_backend: "cloudtasks" or "local".
     """
-    def __init__(self, api: NotificationApiClient, esc_delay_seconds: int, mailer: Mailer):
+    def __init__(self, api: NotificationApiClient, esc_delay_seconds: int, mailer: Mailer,
+                 max_workers: int = NOTIFY_CONCURRENCY, digest_window: float = DIGEST_WINDOW_SECONDS,
+                 escalation_backend: str = ESCALATION_BACKEND):
         self.api = api
         self.mailer = mailer
         self.esc_delay_seconds = esc_delay_seconds
-        self.tasks_client = tasks_v2.CloudTasksClient()
+        self.escalation_backend = escalation_backend
+        if escalation_backend not in ("cloudtasks", "local"):
+            raise ValueError(f"Unknown escalation backend: {escalation_backend}")
+        self.tasks_client = tasks_v2.CloudTasksClient() if escalation_backend == "cloudtasks" else None
 
         # Getting configuration from environment variables injected by Terraforms
         self.project_id = os.environ.get('PROJECT_ID')
@@ -41,15 +67,40 @@ class NotificationEngine:
         self.queue = os.environ.get('QUEUE_NAME', 'notifications-queue')
         self.ui_url = os.environ.get('UI_URL')
         self.jwt_secret = os.environ.get('JWT_SECRET')
-        self.queue_path = self.tasks_client.queue_path(self.project_id, self.location, self.queue)
+        # Base URL of this service for escalation callbacks; when unset it is
+        # taken from the current Flask request (push mode)
+        self.service_url = os.environ.get('SERVICE_URL')
+        self.queue_path = (
+            self.tasks_client.queue_path(self.project_id, self.location, self.queue)
+            if self.tasks_client else None
+        )
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="notify")
+
+        # Pending digests: admin id -> {"admin", "incidents", "timer", "sent"}
+        self.digest_window = digest_window
+        self._digests = {}
+        # Re-entrant: flush_digests may run from a signal handler
+        self._digest_lock = threading.RLock()
+        if digest_window > 0:
+            atexit.register(self.flush_digests)
+
+        # Incidents whose escalation this process already scheduled; Cloud
+        # Tasks names dedupe across instances
+        self._escalations = TTLCache(maxsize=10000, ttl=esc_delay_seconds + 60)
+        self._escalation_lock = threading.Lock()
 
-    def handle_event(self, event: dict):
+    def handle_event(self, event: dict) -> list[Future] | None:
         """
         Sends the event to the appropriate internal handler based on its type.
+
+        In digest mode a new incident is only queued: the returned futures
+        complete once the digests carrying it have been sent, and the event
+        must not be acknowledged before that.
         """
         if event["type"] == "CREATE_INCIDENT":
             return self._handle_incident_created(event["incident_id"])
         elif event["type"] == "RESOLVE_INCIDENT":
+            self.api.invalidate(event["incident_id"])
             return self._handle_incident_resolved(event["incident_id"])
 
     def _handle_incident_created(self, incident_id: int):
@@ -61,25 +112,42 @@ class NotificationEngine:
             incident_id,
             role="primary"
         )
+        service_name = self.api.get_service_name(incident_id)
+        # Resolved here: the Flask request is not visible from pool threads
+        service_url = self._service_url()
+
+        if self.digest_window > 0:
+            return [
+                self._queue_digest(admin, incident_id, service_name, service_url)
+                for admin in primary_admins
+            ]
 
-        for admin in primary_admins:
-            self._notify_admin(incident_id, admin, escalation=False)
+        # One escalation per incident, scheduled alongside the emails
+        escalation = self.pool.submit(self._schedule_escalation, incident_id, service_url)
+        self._fan_out(
+            lambda admin: self._notify_admin(incident_id, admin, service_name),
+            primary_admins
+        )
+        escalation.result()
 
-    def _notify_admin(self, incident_id: int, admin: dict, escalation: bool):
+    def _fan_out(self, fn, items: list):
         """
-        Generates an acknowledgment token, sends a notification email to the admin,
-        records the contact attempt, and schedules escalation if required.
+        Runs `fn` for every item on the pool and waits for all of them; the
+        first failure is re-raised once every call has finished.
         """
-        token = self._generate_ack_token(
-            incident_id=incident_id,
-            admin_id=admin['id'], 
-            jwt_secret=self.jwt_secret
-        )
+        futures = [self.pool.submit(fn, item) for item in items]
+        errors = [f.exception() for f in futures]
+        for error in errors:
+            if error is not None:
+                raise error
 
-        service_name = self.api.get_service_name(incident_id)
+    def _notify_admin(self, incident_id: int, admin: dict, service_name: str | None = None):
+        """
+        Generates an acknowledgment token, sends a notification email to the admin
+        and records the contact attempt.
+        """
         service_str = f" {service_name}" if service_name else ""
-
-        link = f"{self.ui_url}/incidents/ack?token={token}"
+        link = self._ack_link(incident_id, admin['id'])
 
         success = self.mailer.send(
             to=admin['contact_value'],
@@ -87,6 +155,17 @@ class NotificationEngine:
             body=f"Service{service_str} is DOWN.\n\nClick to acknowledge:\n\n{link}"
         )
 
+        self._record_contact_attempt(incident_id, admin, success)
+
+    def _ack_link(self, incident_id: int, admin_id: int) -> str:
+        token = self._generate_ack_token(
+            incident_id=incident_id,
+            admin_id=admin_id,
+            jwt_secret=self.jwt_secret
+        )
+        return f"{self.ui_url}/incidents/ack?token={token}"
+
+    def _record_contact_attempt(self, incident_id: int, admin: dict, success: bool):
         self.api.add_contact_attempt({
             "incident_id": incident_id,
             "admin_id": admin['id'],
@@ -94,8 +173,72 @@ class NotificationEngine:
             "result": "sent" if success else "failed"
         })
 
-        if not escalation:
-            self._schedule_escalation(incident_id)
+    def _queue_digest(self, admin: dict, incident_id: int, service_name: str | None, service_url: str) -> Future:
+        """
+        Adds the incident to the admin's pending digest, once even if the event
+        is redelivered; the first incident starts the coalescing window.
+        Returns a future completed when the digest has been sent.
+        """
+        with self._digest_lock:
+            digest = self._digests.get(admin['id'])
+            if digest is None:
+                timer = threading.Timer(self.digest_window, self._flush_digest, args=(admin['id'],))
+                timer.daemon = True
+                digest = self._digests[admin['id']] = {
+                    "admin": admin, "incidents": [], "timer": timer, "sent": Future()
+                }
+                timer.start()
+            if all(queued[0] != incident_id for queued in digest["incidents"]):
+                digest["incidents"].append((incident_id, service_name, service_url))
+            return digest["sent"]
+
+    def _flush_digest(self, admin_id: int):
+        """
+        Sends one email listing every incident queued for the admin, then
+        records a contact attempt and schedules escalation per incident.
+        """
+        with self._digest_lock:
+            digest = self._digests.pop(admin_id, None)
+        if digest is None:
+            return
+        digest["timer"].cancel()
+
+        admin, incidents = digest["admin"], digest["incidents"]
+        try:
+            if len(incidents) == 1:
+                incident_id, service_name, service_url = incidents[0]
+                self._notify_admin(incident_id, admin, service_name)
+                self._schedule_escalation(incident_id, service_url)
+            else:
+                lines = [
+                    f"- {service_name or 'Unknown Service'} is DOWN: {self._ack_link(incident_id, admin['id'])}"
+                    for incident_id, service_name, _ in incidents
+                ]
+                success = self.mailer.send(
+                    to=admin['contact_value'],
+                    subject=f"{len(incidents)} incidents detected",
+                    body="The following services are DOWN.\n\nClick to acknowledge:\n\n" + "\n".join(lines)
+                )
+
+                for incident_id, _, service_url in incidents:
+                    self._record_contact_attempt(incident_id, admin, success)
+                    self._schedule_escalation(incident_id, service_url)
+
+        except Exception as e:
+            print(f"Failed to send digest to admin {admin_id}: {e}")
+            digest["sent"].set_exception(e)
+        else:
+            digest["sent"].set_result(None)
+
+    def flush_digests(self):
+        """
+        Sends all pending digests now; registered to run at exit, and called
+        by the pull consumer on SIGTERM.
+        """
+        with self._digest_lock:
+            admin_ids = list(self._digests)
+        for admin_id in admin_ids:
+            self._flush_digest(admin_id)
 
     def _generate_ack_token(self, incident_id: int, admin_id: int, jwt_secret: str) -> str:
         """
@@ -108,9 +251,46 @@ class NotificationEngine:
         }
         return jwt.encode(payload, jwt_secret, algorithm="HS256")
 
-    def _schedule_escalation(self, incident_id: int):
+    def _service_url(self) -> str | None:
+        """
+        Base URL of this service, from configuration or the current request.
+        Not needed when escalations run locally.
+        """
+        if self.escalation_backend == "local":
+            return None
+        return self.service_url or f"https://{request.host}"
+
+    def _schedule_escalation(self, incident_id: int, service_url: str | None = None):
+        """
+        Schedules the escalation check for the incident, at most once.
+        """
+        with self._escalation_lock:
+            if self._escalations.get(incident_id):
+                return
+            self._escalations.set(incident_id, True)
+
+        try:
+            if self.escalation_backend == "local":
+                timer = threading.Timer(self.esc_delay_seconds, self._run_escalation_check, args=(incident_id,))
+                timer.daemon = True
+                timer.start()
+                print(f"Scheduled local escalation for incident {incident_id}")
+            else:
+                self._create_escalation_task(incident_id, service_url)
+        except Exception:
+            self._escalations.pop(incident_id)
+            raise
+
+    def _run_escalation_check(self, incident_id: int):
+        try:
+            self.handle_escalation_check(incident_id)
+        except Exception as e:
+            print(f"Escalation check for incident {incident_id} failed: {e}")
+
+    def _create_escalation_task(self, incident_id: int, service_url: str | None = None):
         """
         Creates a task in Cloud Tasks that hits the /escalate endpoint after the delay.
+        The task name is derived from the incident, so duplicates are rejected.
         """
         payload = {"incident_id": incident_id}
         body = json.dumps(payload).encode()
@@ -120,12 +300,12 @@ class NotificationEngine:
         timestamp = timestamp_pb2.Timestamp()
         timestamp.FromDatetime(d)
 
-        # Get URL from current request
-        current_host = request.host
-        target_url = f"https://{current_host}/escalate"
+        service_url = service_url or self._service_url()
+        target_url = f"{service_url}/escalate"
 
         # Configure Cloud Tasks request
         task = {
+            "name": f"{self.queue_path}/tasks/escalation-{incident_id}",
             "http_request": {
                 "http_method": tasks_v2.HttpMethod.POST,
                 "url": target_url,
@@ -133,13 +313,17 @@ class NotificationEngine:
                 "body": body,
                 "oidc_token": {
                     "service_account_email": os.environ.get('SERVICE_ACCOUNT_EMAIL'),
-                    "audience": f"https://{current_host}" 
+                    "audience": service_url
                 },
             },
             "schedule_time": timestamp,
         }
 
-        self.tasks_client.create_task(parent=self.queue_path, task=task)
+        try:
+            self.tasks_client.create_task(parent=self.queue_path, task=task)
+        except AlreadyExists:
+            print(f"Escalation for incident {incident_id} already scheduled")
+            return
         print(f"Scheduled escalation for incident {incident_id} via {target_url}")
 
     def handle_escalation_check(self, incident_id: int):
@@ -153,8 +337,12 @@ class NotificationEngine:
             return
 
         secondary_admins = self.api.get_admins_by_incident(incident_id, role="secondary")
-        for admin in secondary_admins:
-            self._notify_admin(incident_id, admin, escalation=True)
+        service_name = self.api.get_service_name(incident_id)
+
+        self._fan_out(
+            lambda admin: self._notify_admin(incident_id, admin, service_name),
+            secondary_admins
+        )
 
     def _handle_incident_resolved(self, incident_id: int):
         """
@@ -163,9 +351,11 @@ class NotificationEngine:
         """
         admins = self.api.get_notified_admins(incident_id)
 
-        for admin in admins:
-            self.mailer.send(
+        self._fan_out(
+            lambda admin: self.mailer.send(
                 to=admin['contact_value'],
                 subject="Incident resolved",
                 body="The service is back online."
-            )
\ No newline at end of file
+            ),
+            admins
+        )
\ No newline at end of file
@@ -7,6 +7,10 @@ resource "google_cloud_run_v2_job" "monitoring" {
   location = var.region
 
   template {
+    # Each task monitors its own shard of the services
+    task_count  = var.monitoring_task_count
+    parallelism = var.monitoring_task_count
+
     template {
       service_account = google_service_account.invoker.email
       containers {
@@ -0,0 +1,92 @@
+# Pull delivery (var.notification_delivery = "pull"): a job runs
+# notification_module.consumer against its own pull subscription. The
+# consumer extends leases every PULL_LEASE_INTERVAL (10s), well inside the
+# subscription's ack deadline.
+resource "google_pubsub_subscription" "alerting_pull" {
+  count = var.notification_delivery == "pull" ? 1 : 0
+
+  name  = "alerting-notification-pull"
+  topic = google_pubsub_topic.alerting.name
+
+  ack_deadline_seconds = 60
+}
+
+resource "google_cloud_run_v2_job" "notification_consumer" {
+  count = var.notification_delivery == "pull" ? 1 : 0
+
+  depends_on = [ google_secret_manager_secret_iam_member.notification_access,
+                 google_pubsub_subscription_iam_member.notification_subscriber,
+                 google_cloud_run_service_iam_member.api_notification_invoker
+  ]
+  name     = "alerting-notification-consumer"
+  location = var.region
+
+  template {
+    template {
+      service_account = google_service_account.notification.email
+      # The consumer pulls until it is stopped
+      timeout     = "86400s"
+      max_retries = 3
+
+      containers {
+        image   = var.notification_image
+        command = ["python", "-m", "notification_module.consumer"]
+
+        env {
+          name  = "PUBSUB_SUBSCRIPTION"
+          value = google_pubsub_subscription.alerting_pull[0].id
+        }
+        env {
+          name  = "API_BASE_URL"
+          value = google_cloud_run_service.api.status[0].url
+        }
+        env {
+          name  = "PROJECT_ID"
+          value = var.project_id
+        }
+        env {
+          name  = "LOCATION"
+          value = var.region
+        }
+        env {
+          name  = "QUEUE_NAME"
+          value = google_cloud_tasks_queue.notifications.name
+        }
+        env {
+          name  = "SERVICE_ACCOUNT_EMAIL"
+          value = google_service_account.notification.email
+        }
+        # Escalation checks are still served by the notification service
+        env {
+          name  = "SERVICE_URL"
+          value = google_cloud_run_service.notification.status[0].url
+        }
+        env {
+          name  = "UI_URL"
+          value = google_cloud_run_service.ui.status[0].url
+        }
+
+        dynamic "env" {
+          for_each = {
+            SMTP_HOST     = google_secret_manager_secret.smtp_host.secret_id
+            SMTP_PORT     = google_secret_manager_secret.smtp_port.secret_id
+            SMTP_FROM     = google_secret_manager_secret.smtp_from.secret_id
+            SMTP_USERNAME = google_secret_manager_secret.smtp_username.secret_id
+            SMTP_PASSWORD = google_secret_manager_secret.smtp_password.secret_id
+            JWT_SECRET    = google_secret_manager_secret.jwt_secret.secret_id
+          }
+
+          content {
+            name = env.key
+            value_source {
+              secret_key_ref {
+                secret  = env.value
+                version = "latest"
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
@@ -138,6 +138,8 @@ resource "google_pubsub_topic_iam_member" "invoker_publisher" {
 }
 
 resource "google_pubsub_subscription" "alerting_push" {
+  count = var.notification_delivery == "push" ? 1 : 0
+
   name  = "alerting-notification-push"
   topic = google_pubsub_topic.alerting.name
   
@@ -153,9 +155,23 @@ resource "google_pubsub_subscription" "alerting_push" {
   }
 }
 
+moved {
+  from = google_pubsub_subscription.alerting_push
+  to   = google_pubsub_subscription.alerting_push[0]
+}
+
 resource "google_cloud_run_service_iam_member" "notification_push_invoker" {
   service  = google_cloud_run_service.notification.name
   location = google_cloud_run_service.notification.location
   role     = "roles/run.invoker"
   member   = "serviceAccount:${google_service_account.invoker.email}"
-}
\ No newline at end of file
+}
+
+# IAM: Notification -> PubSub Subscriber (pull delivery)
+resource "google_pubsub_subscription_iam_member" "notification_subscriber" {
+  count = var.notification_delivery == "pull" ? 1 : 0
+
+  subscription = google_pubsub_subscription.alerting_pull[0].name
+  role         = "roles/pubsub.subscriber"
+  member       = "serviceAccount:${google_service_account.notification.email}"
+}
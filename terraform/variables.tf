@@ -12,6 +12,11 @@ variable "monitoring_image" {}
 variable "notification_image" {}
 variable "ui_image" {}
 
+variable "monitoring_task_count" {
+  type    = number
+  default = 1
+}
+
 variable "smtp_password" {
   type      = string
   sensitive = true
@@ -21,3 +26,16 @@ variable "smtp_from" {
   type      = string
   sensitive = true
 }
+
+# How the notification side receives incident events: "push" delivers them to
+# the notification service's /event endpoint, "pull" runs
+# notification_module.consumer as a job draining a pull subscription
+variable "notification_delivery" {
+  type    = string
+  default = "push"
+
+  validation {
+    condition     = contains(["push", "pull"], var.notification_delivery)
+    error_message = "notification_delivery must be \"push\" or \"pull\"."
+  }
+}
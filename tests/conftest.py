@@ -1,14 +1,19 @@
 import pytest
-from datetime import datetime, timezone
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
 import os
 import jwt
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, DateTime
+from sqlalchemy.dialects.postgresql import asyncpg
+from sqlalchemy.sql import ClauseElement
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 from datetime import datetime, timezone, timedelta
 
 from api.main import app
 from api import db as db_module
+from api.caching import http_cache, version_cache
 from utils.models import Base, Service, Admin, ServiceAdmin, Incident, ContactAttempt
 
 
@@ -115,9 +120,21 @@ def db_session(tmp_path):
 
 
 @pytest.fixture(scope="function")
-def client(db_session):
+def async_engine(db_session):
+    """
+    Async engine on the same database file as db_session.
+    """
+    return create_async_engine(
+        db_module.async_database_url(db_session.bind.url),
+        poolclass=NullPool
+    )
+
+
+@pytest.fixture(scope="function")
+def client(db_session, async_engine):
     """
     FastAPI TestClient that uses the SQLAlchemy session from db_session.
+    Async endpoints get their own AsyncSession on the same database file.
     """
     def override_get_db():
         try:
@@ -125,13 +142,109 @@ def client(db_session):
         finally:
             pass
 
+    TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[db_module.get_db] = override_get_db
+    app.dependency_overrides[db_module.get_async_db] = override_get_async_db
+    # Every test starts from a new database with the same table versions
+    http_cache.clear()
+    version_cache.clear()
 
     with TestClient(app) as c:
         yield c
 
     app.dependency_overrides.clear()
 
+
+class QueryCounter:
+    """
+    Records SQL statements sent to the database by the sync and async engines.
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @contextmanager
+    def budget(self, max_queries: int):
+        """
+        Fails if the wrapped block issues more than `max_queries` statements.
+        """
+        start = len(self.statements)
+        yield
+        issued = self.statements[start:]
+        assert len(issued) <= max_queries, (
+            f"{len(issued)} queries issued, budget is {max_queries}:\n" + "\n\n".join(issued)
+        )
+
+
+@pytest.fixture(scope="function")
+def query_counter(db_session, async_engine):
+    """
+    Query-count regression guard:
+
+        with query_counter.budget(1):
+            client.get("/services/1/admins")
+    """
+    counter = QueryCounter()
+    engines = [db_session.bind, async_engine.sync_engine]
+    for e in engines:
+        event.listen(e, "before_cursor_execute", counter._on_execute)
+    yield counter
+    for e in engines:
+        event.remove(e, "before_cursor_execute", counter._on_execute)
+
+
+class AsyncpgBinds:
+    """
+    Recompiles the statements run on the async engine for asyncpg and encodes
+    their datetime parameters the way asyncpg does: TIMESTAMP WITHOUT TIME
+    ZONE values are subtracted from a naive epoch, which fails for aware ones.
+    """
+
+    dialect = asyncpg.dialect()
+    epoch = datetime(2000, 1, 1)
+
+    def __init__(self):
+        self.checked = 0
+        self.errors = []
+
+    def _on_execute(self, conn, clauseelement, multiparams, params, execution_options):
+        if not isinstance(clauseelement, ClauseElement):
+            return
+        for p in [m for m in multiparams if isinstance(m, dict)] or [params or {}]:
+            compiled = clauseelement.compile(dialect=self.dialect, column_keys=list(p))
+            for name, value in compiled.construct_params(p).items():
+                bind_type = compiled.binds[name].type
+                if not isinstance(value, datetime) or not isinstance(bind_type, DateTime):
+                    continue
+                self.checked += 1
+                try:
+                    if bind_type.timezone:
+                        value.astimezone(timezone.utc)
+                    else:
+                        value - self.epoch
+                except TypeError as e:
+                    self.errors.append(f"{name}={value!r}: {e}\n{compiled}")
+
+
+@pytest.fixture(scope="function")
+def asyncpg_binds(async_engine):
+    """
+    Fails datetime parameters that asyncpg could not encode, although the
+    tests themselves run on aiosqlite.
+    """
+    binds = AsyncpgBinds()
+    event.listen(async_engine.sync_engine, "before_execute", binds._on_execute)
+    yield binds
+    event.remove(async_engine.sync_engine, "before_execute", binds._on_execute)
+
 # -----------------------------
 # Test helpers
 # -----------------------------
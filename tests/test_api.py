@@ -1,5 +1,8 @@
-from utils.models import Service, Admin, ServiceAdmin, Incident
+from sqlalchemy import text, inspect, create_engine
+from utils.models import Service, Admin, ServiceAdmin, Incident, PingFailure, ContactAttempt, ensure_indexes
 from datetime import datetime, timezone, timedelta
+from utils.sharding import owns
+from api.db import async_database_url, PoolMetrics
 from tests.conftest import make_ack_token
 
 
@@ -41,6 +44,14 @@ def test_get_missing_service(client):
     resp = client.get("/services/999")
     assert resp.status_code == 404
 
+def test_list_services(client):
+    resp = client.get("/services")
+    assert resp.status_code == 200
+    assert [s["id"] for s in resp.json()] == [1, 2]
+
+    shards = [client.get(f"/services?shard_index={i}&shard_count=2").json() for i in range(2)]
+    assert sorted(s["id"] for shard in shards for s in shard) == [1, 2]
+
 def test_get_due_services(client, db_session):
     
     svc = db_session.get(Service, 1)
@@ -55,6 +66,78 @@ def test_get_due_services(client, db_session):
     assert len(services) == 1
     assert services[0]["id"] == 1
 
+def test_claim_due_services(client, db_session):
+    overdue = (datetime.now(timezone.utc) - timedelta(seconds=10)).replace(tzinfo=None)
+    for svc in db_session.query(Service).all():
+        svc.next_at = overdue
+        svc.frequency_seconds = 60
+    db_session.commit()
+
+    resp = client.post("/services/claim", json={"worker_id": "worker-1", "limit": 1})
+    assert resp.status_code == 200
+    assert len(resp.json()) == 1
+
+    # The claimed service is rescheduled, so the next claim gets the other one
+    resp = client.post("/services/claim", json={"worker_id": "worker-2", "limit": 10})
+    assert [s["id"] for s in resp.json()] == [2]
+
+    resp = client.post("/services/claim", json={"worker_id": "worker-1", "limit": 10})
+    assert resp.json() == []
+
+    db_session.expire_all()
+    assert db_session.get(Service, 1).next_at > overdue
+
+def test_claim_due_services_by_shard(client, db_session):
+    overdue = (datetime.now(timezone.utc) - timedelta(seconds=10)).replace(tzinfo=None)
+    for svc in db_session.query(Service).all():
+        svc.next_at = overdue
+    db_session.commit()
+
+    claimed = []
+    for shard_index in range(2):
+        resp = client.post("/services/claim", json={
+            "worker_id": f"worker-{shard_index}", "shard_index": shard_index, "shard_count": 2
+        })
+        assert resp.status_code == 200
+        ids = [s["id"] for s in resp.json()]
+        assert all(owns(i, shard_index, 2) for i in ids)
+        claimed.extend(ids)
+
+    assert sorted(claimed) == [1, 2]
+
+def test_claim_by_shard_pages_through_due_services(client, db_session, monkeypatch):
+    overdue = (datetime.now(timezone.utc) - timedelta(seconds=10)).replace(tzinfo=None)
+    db_session.add_all([
+        Service(name=f"svc{i}", IP=f"2.2.2.{i}", frequency_seconds=60, alerting_window_npings=3,
+                failure_threshold=2, next_at=overdue + timedelta(seconds=i))
+        for i in range(3, 11)
+    ])
+    for svc in db_session.query(Service).filter(Service.id <= 2):
+        svc.next_at = overdue
+    db_session.commit()
+    monkeypatch.setattr("api.main.CLAIM_SCAN_PAGE_SIZE", 2)
+
+    owned = [i for i in range(1, 11) if owns(i, 1, 3)]
+    resp = client.post("/services/claim", json={"worker_id": "w", "limit": 2, "shard_index": 1, "shard_count": 3})
+    assert sorted(s["id"] for s in resp.json()) == owned[:2]
+
+    resp = client.post("/services/claim", json={"worker_id": "w", "shard_index": 1, "shard_count": 3})
+    assert sorted(s["id"] for s in resp.json()) == owned[2:]
+
+def test_claim_invalid_shard(client):
+    for claim in (
+        {"shard_index": 2, "shard_count": 2},
+        {"shard_index": -1, "shard_count": 2},
+        {"shard_count": 0},
+        {"limit": 0},
+    ):
+        resp = client.post("/services/claim", json={"worker_id": "w", **claim})
+        assert resp.status_code == 422
+
+def test_list_services_invalid_shard(client):
+    for params in ("shard_index=2&shard_count=2", "shard_index=-1", "shard_count=0"):
+        assert client.get(f"/services?{params}").status_code == 422
+
 def test_edit_service(client, db_session):
     resp = client.put(
         "/services/1",
@@ -199,6 +282,14 @@ def test_get_all_admins(client):
     assert resp.status_code == 200
     assert len(resp.json()) >= 4
 
+def test_get_all_admins_paginated(client):
+    resp = client.get("/admins/", params={"limit": 3})
+    assert [a["name"] for a in resp.json()] == ["Alice", "Bob", "Hanna"]
+
+    resp = client.get("/admins/", params={"limit": 3, "cursor": resp.headers["X-Next-Cursor"]})
+    assert [a["name"] for a in resp.json()] == ["John"]
+    assert "X-Next-Cursor" not in resp.headers
+
 def test_get_admin_by_contact(client):
     resp = client.get("/admins/contact/alice@test.com")
     assert resp.status_code == 200
@@ -212,6 +303,80 @@ def test_get_services_for_admin(client):
     assert len(services) == 1
     assert services[0]["name"] == "svc1"
 
+def test_get_admin_dashboard(client, db_session):
+    db_session.add_all([Incident(service_id=1, status="resolved") for _ in range(3)])
+    db_session.commit()
+
+    resp = client.get("/admins/2/dashboard?incident_limit=2")
+    assert resp.status_code == 200
+
+    [svc] = resp.json()
+    assert svc["name"] == "svc1"
+    assert svc["primary"]["name"] == "Alice"
+    assert svc["secondary"]["name"] == "Bob"
+    assert len(svc["incidents"]) == 2
+    assert all(i["service_id"] == 1 for i in svc["incidents"])
+
+    resp = client.get("/admins/2/dashboard?incident_limit=500")
+    [svc] = resp.json()
+    assert len(svc["incidents"]) == 4
+    assert [(a["incident_id"], a["admin_name"]) for a in svc["attempts"]] == [(1, "Alice")]
+
+def test_get_missing_admin_dashboard(client):
+    assert client.get("/admins/999/dashboard").status_code == 404
+
+# -----------------------------
+# Conditional GETs
+# -----------------------------
+
+def test_conditional_get_not_modified(client):
+    resp = client.get("/services/1")
+    etag = resp.headers["ETag"]
+    assert "Last-Modified" in resp.headers
+
+    resp = client.get("/services/1", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+
+    # Different URLs never share an ETag
+    assert client.get("/services/2").headers["ETag"] != etag
+
+def test_write_changes_etag(client):
+    etag = client.get("/services").headers["ETag"]
+
+    client.put("/services/1", json={"frequency_seconds": 90, "alerting_window_npings": 3, "failure_threshold": 2})
+
+    resp = client.get("/services", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert resp.json()[0]["frequency_seconds"] == 90
+
+def test_admin_write_changes_dependent_etags(client, db_session):
+    etags = {url: client.get(url).headers["ETag"] for url in ["/admins/", "/services/1/admins", "/services"]}
+
+    admin = db_session.get(Admin, 1)
+    admin.name = "Alicia"
+    db_session.commit()
+
+    assert client.get("/admins/").headers["ETag"] != etags["/admins/"]
+    resp = client.get("/services/1/admins")
+    assert resp.headers["ETag"] != etags["/services/1/admins"]
+    assert resp.json()["primary"]["name"] == "Alicia"
+    # Services do not depend on admins
+    assert client.get("/services").headers["ETag"] == etags["/services"]
+
+def test_cached_body_served_until_write(client, query_counter):
+    first = client.get("/admins/", params={"limit": 3})
+
+    with query_counter.budget(1):
+        again = client.get("/admins/", params={"limit": 3})
+    assert again.json() == first.json()
+    assert again.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+
+    client.post("/admins/", json={"name": "Kate", "contact_type": "email", "contact_value": "kate@test.com"})
+    resp = client.get("/admins/")
+    assert "Kate" in [a["name"] for a in resp.json()]
+
 # -----------------------------
 # Incidents
 # -----------------------------
@@ -233,6 +398,27 @@ def test_list_service_incidents(client):
     assert resp.status_code == 200
     assert len(resp.json()) >= 1
 
+def test_list_service_incidents_paginated(client, db_session):
+    start = datetime(2024, 1, 1)
+    db_session.add_all([
+        Incident(service_id=1, status="resolved", started_at=start + timedelta(days=d)) for d in range(5)
+    ])
+    db_session.commit()
+
+    resp = client.get("/services/1/incidents", params={"limit": 2, "until": "2024-01-05T00:00:00"})
+    assert [i["started_at"][:10] for i in resp.json()] == ["2024-01-04", "2024-01-03"]
+
+    cursor = resp.headers["X-Next-Cursor"]
+    resp = client.get("/services/1/incidents", params={"limit": 2, "until": "2024-01-05T00:00:00", "cursor": cursor})
+    assert [i["started_at"][:10] for i in resp.json()] == ["2024-01-02", "2024-01-01"]
+    assert "X-Next-Cursor" not in resp.headers
+
+    resp = client.get("/services/1/incidents", params={"since": "2024-01-04T00:00:00", "until": "2024-01-05T00:00:00"})
+    assert len(resp.json()) == 1
+
+def test_list_service_incidents_invalid_cursor(client):
+    assert client.get("/services/1/incidents", params={"cursor": "nope"}).status_code == 400
+
 def test_list_open_incidents_for_service(client):
     resp = client.get("/services/1/incidents/open")
     assert resp.status_code == 200
@@ -253,6 +439,18 @@ def test_get_incident_admins(client):
     assert resp.status_code == 200
     assert len(resp.json()) == 2
 
+def test_get_incident_context(client):
+    resp = client.get("/incidents/1/context")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["incident"]["id"] == 1
+    assert data["service"]["id"] == data["incident"]["service_id"]
+    assert [a["name"] for a in data["admins"]["primary"]] == ["Alice"]
+    assert [a["name"] for a in data["admins"]["secondary"]] == ["Bob"]
+
+def test_get_missing_incident_context(client):
+    assert client.get("/incidents/999/context").status_code == 404
+
 def test_get_notified_admins(client):
     resp = client.get("/incidents/1/notified-admins")
     assert resp.status_code == 200
@@ -297,11 +495,111 @@ def test_list_recent_failures(client):
     assert len(resp.json()) >= 1
     assert resp.json()[0]["service_id"] == 1
 
+def test_list_recent_failures_paginated(client):
+    for _ in range(3):
+        client.post("/services/1/failures")
+
+    resp = client.get("/services/1/failures/recent", params={"window_seconds": 60, "limit": 2})
+    first = resp.json()
+    assert len(first) == 2
+
+    resp = client.get("/services/1/failures/recent", params={
+        "window_seconds": 60, "limit": 2, "cursor": resp.headers["X-Next-Cursor"]
+    })
+    assert len(resp.json()) == 1
+    assert {f["id"] for f in first}.isdisjoint(f["id"] for f in resp.json())
+
+def test_count_recent_failures(client):
+    client.post("/services/1/failures")
+    client.post("/services/1/failures")
+
+    resp = client.get("/services/1/failures/recent/count?window_seconds=60")
+    assert resp.status_code == 200
+    assert resp.json() == {"service_id": 1, "count": 2}
+
+def test_count_recent_failures_for_services(client):
+    client.post("/services/1/failures")
+
+    resp = client.get("/failures/recent/count?window_seconds=60&service_ids=1&service_ids=2")
+    assert resp.status_code == 200
+    assert resp.json() == {"1": 1, "2": 0}
+
 def test_cleanup_old_failures(client):
     resp = client.delete("/failures/cleanup")
     assert resp.status_code == 200
     assert "deleted" in resp.json()
 
+# -----------------------------
+# Checks
+# -----------------------------
+
+def test_check_batch_records_failures_and_opens_incident(client, db_session):
+    # svc2 has failure_threshold=1, so a single failure opens an incident
+    resp = client.post("/checks/batch", json={"results": [
+        {"service_id": 1, "success": True},
+        {"service_id": 2, "success": False},
+    ]})
+    assert resp.status_code == 200
+
+    transitions = resp.json()
+    assert len(transitions) == 2
+    created = next(t for t in transitions if t["type"] == "CREATE_INCIDENT")
+    resolved = next(t for t in transitions if t["type"] == "RESOLVE_INCIDENT")
+
+    assert created["service_id"] == 2
+    assert db_session.get(Incident, created["incident_id"]).status == "registered"
+    assert db_session.query(PingFailure).filter_by(service_id=2).count() == 1
+
+    # svc1 had an open incident and no recent failures, so it is resolved
+    assert resolved == {"type": "RESOLVE_INCIDENT", "service_id": 1, "incident_id": 1}
+    assert db_session.get(Incident, 1).status == "resolved"
+
+def test_check_batch_no_duplicate_incident(client, db_session):
+    client.post("/services/1/failures")
+    resp = client.post("/checks/batch", json={"results": [{"service_id": 1, "success": False}]})
+    assert resp.status_code == 200
+
+    # Threshold reached, but svc1 already has an open incident
+    assert resp.json() == []
+    assert db_session.query(Incident).filter_by(service_id=1).count() == 1
+
+def test_check_batch_uses_caller_threshold_decision(client, db_session):
+    resp = client.post("/checks/batch", json={"results": [
+        {"service_id": 2, "success": False, "should_trigger": False},
+    ]})
+    assert resp.status_code == 200
+
+    # Failure is still recorded for audit, but no incident is opened
+    assert resp.json() == []
+    assert db_session.query(PingFailure).filter_by(service_id=2).count() == 1
+    assert db_session.query(Incident).filter_by(service_id=2).count() == 0
+
+def test_check_batch_empty(client):
+    resp = client.post("/checks/batch", json={"results": []})
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+def test_async_writes_bind_asyncpg_compatible_datetimes(client, db_session, asyncpg_binds):
+    overdue = (datetime.now(timezone.utc) - timedelta(seconds=10)).replace(tzinfo=None)
+    for svc in db_session.query(Service).all():
+        svc.next_at = overdue
+    db_session.commit()
+
+    assert client.get("/services/due?limit=1").status_code == 200
+    assert client.post("/services/claim", json={"worker_id": "w", "shard_index": 0, "shard_count": 2}).status_code == 200
+    assert client.post("/incidents/ack", json={"token": make_ack_token(1, 1)}).status_code == 200
+    assert client.post("/checks/batch", json={"results": [
+        {"service_id": 1, "success": True},
+        {"service_id": 2, "success": False},
+    ]}).status_code == 200
+    assert client.patch("/incidents/1/resolve").status_code == 200
+    assert client.post(
+        "/contact_attempts/", json={"incident_id": 1, "admin_id": 1, "channel": "email"}
+    ).status_code == 200
+
+    assert asyncpg_binds.checked
+    assert asyncpg_binds.errors == []
+
 # -----------------------------
 # Contact attempts
 # -----------------------------
@@ -322,3 +620,130 @@ def test_update_contact_attempt(client):
     resp = client.patch("/contact_attempts/1?result=acknowledged")
     assert resp.status_code == 200
     assert resp.json()["result"] == "acknowledged"
+
+def test_get_contact_attempts_paginated(client):
+    for admin_id in (1, 2):
+        client.post("/contact_attempts/", json={"incident_id": 1, "admin_id": admin_id, "channel": "email"})
+
+    resp = client.get("/contact_attempts", params={"service_id": 1, "limit": 2})
+    assert resp.status_code == 200
+    assert [a["admin_name"] for a in resp.json()] == ["Bob", "Alice"]
+
+    resp = client.get("/contact_attempts", params={"service_id": 1, "limit": 2, "cursor": resp.headers["X-Next-Cursor"]})
+    assert [a["admin_name"] for a in resp.json()] == ["Alice"]
+    assert "X-Next-Cursor" not in resp.headers
+
+# -----------------------------
+# Query budgets
+# -----------------------------
+
+def test_read_endpoints_stay_within_query_budget(client, db_session, query_counter):
+    # Extra rows must not add queries
+    db_session.add_all([Incident(service_id=1, status="resolved") for _ in range(5)])
+    db_session.add_all([
+        ContactAttempt(incident_id=1, admin_id=2, channel="email", attempted_at=datetime.now(timezone.utc))
+        for _ in range(5)
+    ])
+    db_session.commit()
+
+    budgets = {
+        # Table version lookup for the ETag plus the data query
+        "/services/1/admins": 2,
+        "/incidents/1/admins": 1,
+        "/incidents/1/admins?role=primary": 1,
+        "/incidents/1/notified-admins": 1,
+        "/contact_attempts?service_id=1": 1,
+        "/services/1/incidents": 1,
+        "/admins/1/dashboard": 5,
+    }
+    for url, budget in budgets.items():
+        with query_counter.budget(budget):
+            assert client.get(url).status_code == 200
+
+def test_get_incident_admins_missing_incident(client):
+    assert client.get("/incidents/999/admins").status_code == 404
+
+def test_get_incident_admins_by_role(client):
+    resp = client.get("/incidents/1/admins?role=secondary")
+    assert [a["name"] for a in resp.json()] == ["Bob"]
+
+# -----------------------------
+# Database
+# -----------------------------
+
+def test_async_database_url():
+    url = async_database_url("postgresql+psycopg2://u:p@/db?host=/cloudsql/x")
+    assert url.drivername == "postgresql+asyncpg"
+    assert url.query == {"host": "/cloudsql/x"}
+    assert url.password == "p"
+
+    assert async_database_url("sqlite:///test.db").drivername == "sqlite+aiosqlite"
+
+def test_pool_metrics(db_session):
+    engine = create_engine(db_session.bind.url, pool_size=2, max_overflow=1)
+    metrics = PoolMetrics(engine)
+
+    with engine.connect():
+        metrics.observe_checkout(0.003)
+        metrics.observe_checkout(2.0)
+        stats = metrics.snapshot()
+
+    assert stats["pool"] == "QueuePool"
+    assert stats["checkedout"] == 1
+    assert stats["connections_created"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["max_checkout_seconds"] == 2.0
+    assert stats["checkout_histogram"]["le_0.005"] == 1
+    assert stats["checkout_histogram"]["le_5.0"] == 1
+    engine.dispose()
+
+def test_db_pool_metrics_endpoint(client):
+    resp = client.get("/metrics/db-pool")
+    assert resp.status_code == 200
+    assert set(resp.json()) == {"sync", "async"}
+    assert "checkout_histogram" in resp.json()["sync"]
+
+# -----------------------------
+# Indexes
+# -----------------------------
+
+def _query_plan(db_session, query):
+    sql = query.statement.compile(
+        dialect=db_session.bind.dialect,
+        compile_kwargs={"literal_binds": True}
+    )
+    rows = db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return " ".join(row[-1] for row in rows)
+
+def test_hot_queries_use_indexes(db_session):
+    now = datetime.now(timezone.utc)
+    hot_queries = {
+        "ix_services_next_at": db_session.query(Service).filter(Service.next_at <= now),
+        "ix_incidents_open_service_id": db_session.query(Incident).filter(
+            Incident.service_id == 1,
+            Incident.status.in_(["registered", "acknowledged"])
+        ),
+        "ix_contact_attempts_incident_admin_attempted_at": db_session.query(ContactAttempt).filter(
+            ContactAttempt.incident_id == 1,
+            ContactAttempt.admin_id == 1
+        ).order_by(ContactAttempt.attempted_at.desc()),
+        "ix_ping_failures_service_id_failed_at": db_session.query(PingFailure).filter(
+            PingFailure.service_id == 1,
+            PingFailure.failed_at >= now
+        ),
+        "ix_incidents_service_id_started_at": db_session.query(Incident).filter(
+            Incident.service_id == 1
+        ).order_by(Incident.started_at.desc()).limit(10),
+    }
+
+    for index_name, query in hot_queries.items():
+        assert index_name in _query_plan(db_session, query)
+
+def test_ensure_indexes_adds_missing_index(db_session):
+    db_session.execute(text("DROP INDEX ix_services_next_at"))
+    db_session.commit()
+
+    ensure_indexes(db_session.bind)
+
+    indexes = {i["name"] for i in inspect(db_session.bind).get_indexes("services")}
+    assert "ix_services_next_at" in indexes
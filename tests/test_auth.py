@@ -0,0 +1,103 @@
+import time
+import asyncio
+import threading
+import jwt
+import pytest
+from unittest.mock import patch
+
+from utils.auth import TokenCache, get_headers_async
+
+
+def make_identity_token(expires_in: float) -> str:
+    return jwt.encode({"exp": int(time.time() + expires_in)}, "secret", algorithm="HS256")
+
+
+def test_token_cached_until_expiry():
+    calls = []
+
+    def fetch(audience):
+        calls.append(audience)
+        return make_identity_token(3600)
+
+    cache = TokenCache(fetch=fetch)
+    token = cache.get("https://api")
+    assert cache.get("https://api") == token
+    assert calls == ["https://api"]
+
+    cache.get("https://other")
+    assert calls == ["https://api", "https://other"]
+
+
+def test_expired_token_is_fetched_again():
+    tokens = iter([make_identity_token(-10), make_identity_token(3600)])
+    cache = TokenCache(fetch=lambda audience: next(tokens))
+
+    first = cache.get("https://api")
+    assert cache.get("https://api") != first
+
+
+def test_token_refreshed_in_background_before_expiry():
+    fetched = threading.Event()
+    tokens = iter([make_identity_token(60), make_identity_token(3600)])
+
+    def fetch(audience):
+        token = next(tokens)
+        fetched.set()
+        return token
+
+    cache = TokenCache(fetch=fetch, refresh_margin=300)
+    first = cache.get("https://api")
+    fetched.clear()
+
+    # Still valid, so it is served while a refresh runs in the background
+    assert cache.get("https://api") == first
+    assert fetched.wait(timeout=2)
+    time.sleep(0.05)
+    assert cache.get("https://api") != first
+
+
+def test_failed_background_refresh_backs_off():
+    calls = []
+    first = make_identity_token(60)
+
+    def fetch(audience):
+        calls.append(audience)
+        return first if len(calls) == 1 else None
+
+    cache = TokenCache(fetch=fetch, refresh_margin=300, retry_after=60)
+    assert cache.get("https://api") == first
+
+    # The refresh fails, but the still valid token keeps being served and no
+    # new refresh starts until the retry delay has passed
+    for _ in range(5):
+        assert cache.get("https://api") == first
+        time.sleep(0.05)
+    assert len(calls) == 2
+
+
+def test_concurrent_misses_fetch_once():
+    calls = []
+
+    def fetch(audience):
+        calls.append(audience)
+        time.sleep(0.05)
+        return make_identity_token(3600)
+
+    cache = TokenCache(fetch=fetch)
+    threads = [threading.Thread(target=cache.get, args=("https://api",)) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_headers_use_shared_cache():
+    cache = TokenCache(fetch=lambda audience: "token")
+
+    with patch("utils.auth._token_cache", cache):
+        headers = await asyncio.gather(*(get_headers_async("https://api") for _ in range(5)))
+
+    assert all(h == {"Authorization": "Bearer token"} for h in headers)
@@ -1,8 +1,18 @@
+import asyncio
+import threading
 import pytest
+from concurrent.futures import Future
 from unittest.mock import patch, AsyncMock, MagicMock
 import httpx
 
 from monitoring_module.collector import IPStatusCollector
+from monitoring_module.monitoring_engine import MonitoringEngine
+from monitoring_module.failure_window import FailureWindow
+from monitoring_module.scheduler import CheckScheduler
+from monitoring_module.executor import ProbeExecutor
+from utils.transport import EventTransport, ConsumableTransport, PubSubTransport, QueueTransport, FileTransport
+from utils.sharding import HashRing, owns
+from notification_module import consumer, local_runner
 
 
 @pytest.fixture
@@ -63,7 +73,7 @@ async def test_record_failure_calls_api(collector):
 @pytest.mark.asyncio
 async def test_should_trigger_incident_false(collector):
     with patch("httpx.AsyncClient.get", new_callable=AsyncMock) as mock_get:
-        mock_get.return_value.json.return_value = [1]  # 1 failure < threshold
+        mock_get.return_value.json.return_value = {"count": 1}  # 1 failure < threshold
         assert await collector._should_trigger_incident() is False
 
 
@@ -71,7 +81,7 @@ async def test_should_trigger_incident_false(collector):
 async def test_should_trigger_incident_true(collector):
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = [1, 2, 3]
+    mock_response.json.return_value = {"count": 3}
 
     # Mock auth
     with patch("monitoring_module.collector.get_headers_async", return_value={"Authorization": "Bearer test"}):
@@ -117,3 +127,482 @@ async def test_run_once_no_duplicate_incident(collector):
 
         await collector.run_once()
         mock_create.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_run_once_flushes_wrapped_pubsub_client(service):
+    delivered = Future()
+    delivered.set_result("id-1")
+    client = MagicMock()
+    client.publish.return_value = delivered
+    collector = IPStatusCollector(service, "http://api", "projects/test/topics/incidents", publisher=client)
+
+    with patch.object(collector, "_perform_check", return_value=False), \
+         patch.object(collector, "_record_failure", new_callable=AsyncMock), \
+         patch.object(collector, "_should_trigger_incident", return_value=True), \
+         patch.object(collector, "_get_open_incident", return_value=None), \
+         patch.object(collector, "_create_incident", return_value={"id": 123}):
+        await collector.run_once()
+
+    client.publish.assert_called_once()
+    assert collector.publisher._pending == []
+
+
+@pytest.mark.asyncio
+async def test_run_once_closes_clients_it_created(service):
+    shared = httpx.AsyncClient()
+    collector = IPStatusCollector(service, "http://api", "projects/test/topics/incidents",
+                                  publisher=AsyncMock(spec=EventTransport), api_client=shared)
+
+    with patch.object(collector, "_perform_check", return_value=True), \
+         patch.object(collector, "_should_trigger_incident", return_value=False), \
+         patch.object(collector, "_get_open_incident", return_value=None):
+        await collector.run_once()
+
+    assert collector.probe_client.is_closed
+    assert not shared.is_closed
+    await shared.aclose()
+
+
+def test_event_transport_requires_publish():
+    class Incomplete(EventTransport):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_consumable_transport_requires_consume():
+    class Incomplete(ConsumableTransport):
+        def publish(self, event_type, service_id, incident_id):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    assert not issubclass(PubSubTransport, ConsumableTransport)
+
+
+# -------------------- Connection pooling --------------------
+
+@pytest.fixture
+def engine():
+    with patch("utils.transport.pubsub_v1.PublisherClient"):
+        yield MonitoringEngine(api_base_url="http://api", pubsub_topic="projects/test/topics/incidents")
+
+
+@pytest.mark.asyncio
+async def test_engine_injects_shared_clients(engine, service):
+    with patch.object(engine, "fetch_due_services", return_value=[service, dict(service, id=2)]), \
+         patch.object(engine, "fetch_recent_failure_counts", return_value={}), \
+         patch.object(engine, "submit_results", return_value=[]), \
+         patch.object(IPStatusCollector, "check", autospec=True) as mock_check:
+        await engine.run_once()
+
+    collectors = [call.args[0] for call in mock_check.call_args_list]
+    assert len(collectors) == 2
+    assert all(c.api_client is engine.api_client for c in collectors)
+    assert all(c.probe_client is engine.probe_client for c in collectors)
+    await engine.aclose()
+
+
+@pytest.mark.asyncio
+async def test_engine_pool_stats(engine):
+    stats = engine.pool_stats()
+    assert set(stats) == {"api", "probe"}
+    assert stats["api"]["connections"] == 0
+    await engine.aclose()
+
+
+@pytest.mark.asyncio
+async def test_engine_pool_stats_tolerate_unknown_transport(engine):
+    engine.api_client._transport = object()
+    engine.probe_client._transport = MagicMock(_pool=MagicMock(connections=None))
+    assert engine.pool_stats() == {"api": {}, "probe": {}}
+
+
+# -------------------- Batch ingestion --------------------
+
+@pytest.mark.asyncio
+async def test_engine_submits_one_batch_and_publishes_transitions(engine, service):
+    services = [service, dict(service, id=2)]
+    transitions = [{"type": "CREATE_INCIDENT", "service_id": 2, "incident_id": 7}]
+
+    with patch.object(engine, "fetch_due_services", return_value=services), \
+         patch.object(engine, "fetch_recent_failure_counts", return_value={}), \
+         patch.object(IPStatusCollector, "_perform_check", side_effect=[True, False]), \
+         patch.object(engine, "submit_results", return_value=transitions) as mock_submit, \
+         patch.object(engine, "publish_transitions", new_callable=AsyncMock) as mock_publish:
+        await engine.run_once()
+
+    mock_submit.assert_called_once_with([
+        {"service_id": 1, "success": True, "should_trigger": False},
+        {"service_id": 2, "success": False, "should_trigger": False},
+    ])
+    mock_publish.assert_called_once_with(transitions)
+    await engine.aclose()
+
+
+@pytest.mark.asyncio
+async def test_shared_claim_workers_leave_threshold_to_api(service):
+    with patch("utils.transport.pubsub_v1.PublisherClient"):
+        engine = MonitoringEngine("http://api", "projects/test/topics/incidents", scheduler_mode="poll", shard_count=1)
+
+    with patch.object(engine, "fetch_due_services", return_value=[service]), \
+         patch.object(engine, "fetch_recent_failure_counts") as mock_counts, \
+         patch.object(IPStatusCollector, "_perform_check", return_value=False), \
+         patch.object(engine, "submit_results", return_value=[]) as mock_submit:
+        await engine.run_once()
+
+    # Other workers check the same service, so no partial window is kept
+    mock_submit.assert_called_once_with([{"service_id": 1, "success": False}])
+    mock_counts.assert_not_called()
+    assert engine.windows == {}
+    await engine.aclose()
+
+
+# -------------------- Failure window --------------------
+
+def test_failure_window_slides():
+    window = FailureWindow(size=3, threshold=2)
+    for success in [False, False, True]:
+        window.record(success)
+    assert window.should_trigger() is True
+
+    # The two failures fall out of the window one by one
+    window.record(True)
+    assert window.failures == 1
+    assert window.should_trigger() is False
+    window.record(True)
+    assert window.failures == 0
+
+
+def test_failure_window_seed_and_resize(service):
+    window = FailureWindow.for_service(service)
+    window.seed(50)
+    assert window.failures == service["alerting_window_npings"]
+
+    smaller = dict(service, alerting_window_npings=2)
+    assert not window.matches(smaller)
+    assert window.resized(smaller).failures == 2
+
+
+@pytest.mark.asyncio
+async def test_should_trigger_uses_window_without_api(collector, service):
+    collector.failure_window = FailureWindow.for_service(service)
+    collector.failure_window.seed(3)
+
+    with patch("httpx.AsyncClient.get", new_callable=AsyncMock) as mock_get:
+        assert await collector._should_trigger_incident() is True
+        mock_get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_engine_seeds_windows_once(engine, service):
+    with patch.object(engine, "fetch_recent_failure_counts", return_value={1: 2}) as mock_count:
+        await engine.sync_windows([service])
+        await engine.sync_windows([service])
+
+    mock_count.assert_called_once()
+    assert engine.windows[1].failures == 2
+    await engine.aclose()
+
+
+# -------------------- Sharding --------------------
+
+def test_every_service_has_exactly_one_shard():
+    for service_id in range(200):
+        assert sum(owns(service_id, shard, 3) for shard in range(3)) == 1
+
+
+def test_rebalancing_moves_few_services():
+    before, after = HashRing(4), HashRing(5)
+    moved = sum(before.shard_for(i) != after.shard_for(i) for i in range(2000))
+
+    # Ideal is 1/5 of the services; a modulo split would move ~4/5
+    assert moved < 2000 * 0.3
+
+
+# -------------------- Local scheduler --------------------
+
+def _due_ids(scheduler, now):
+    return [s["id"] for s in scheduler.pop_due(now)]
+
+
+def test_scheduler_fires_at_own_cadence_without_drift(service):
+    scheduler = CheckScheduler()
+    scheduler.sync([service], now=0)
+
+    # First run is placed within one interval
+    assert _due_ids(scheduler, 10) == [1]
+    first = scheduler.next_due()
+
+    # Next run is one period after the previous scheduled time, not after "now"
+    assert _due_ids(scheduler, first + 0.5) == [1]
+    assert scheduler.next_due() == pytest.approx(first + 10)
+
+
+def test_scheduler_skips_missed_runs(service):
+    scheduler = CheckScheduler()
+    scheduler.sync([service], now=0)
+    scheduler.pop_due(10)
+    scheduled = scheduler.next_due()
+
+    # Far behind: one check, then back on the original grid
+    assert _due_ids(scheduler, scheduled + 35) == [1]
+    assert scheduler.next_due() == pytest.approx(scheduled + 40)
+
+
+def test_scheduler_sync_applies_config_changes(service):
+    scheduler = CheckScheduler()
+    scheduler.sync([service, dict(service, id=2)], now=0)
+
+    scheduler.sync([dict(service, frequency_seconds=60)], now=5)
+    assert len(scheduler) == 1
+    assert scheduler.next_due() == pytest.approx(65)
+    assert _due_ids(scheduler, 64) == []
+    assert _due_ids(scheduler, 65) == [1]
+
+
+@pytest.mark.asyncio
+async def test_engine_dispatch_skips_services_in_flight(engine, service):
+    engine.scheduler.sync([service, dict(service, id=2)], now=0)
+    engine._in_flight.add(1)
+
+    with patch.object(engine, "process", new_callable=AsyncMock) as mock_process:
+        engine.dispatch_due(now=10)
+        await asyncio.gather(*engine._tasks)
+
+    mock_process.assert_called_once_with([dict(service, id=2)])
+    assert engine._in_flight == {1}
+    await engine.aclose()
+
+
+# -------------------- Probe executor --------------------
+
+def _tracking_probe(counters, host):
+    async def probe():
+        counters["total"] += 1
+        counters[host] = counters.get(host, 0) + 1
+        counters["max_total"] = max(counters.get("max_total", 0), counters["total"])
+        counters[f"max_{host}"] = max(counters.get(f"max_{host}", 0), counters[host])
+        await asyncio.sleep(0.01)
+        counters["total"] -= 1
+        counters[host] -= 1
+        return host
+    return probe
+
+
+@pytest.mark.asyncio
+async def test_executor_limits_global_and_per_host_concurrency():
+    executor = ProbeExecutor(max_concurrency=4, per_host_limit=2, queue_size=100)
+    counters = {"total": 0}
+    hosts = ["a", "b", "c"] * 10
+
+    results = await asyncio.gather(*(executor.submit(h, _tracking_probe(counters, h)) for h in hosts))
+
+    assert results == hosts
+    assert counters["max_total"] <= 4
+    assert all(counters[f"max_{h}"] <= 2 for h in "abc")
+    assert executor.stats()["completed"] == 30
+    assert executor.stats()["queue_depth"] == 0
+    await executor.aclose()
+
+
+@pytest.mark.asyncio
+async def test_executor_busy_host_does_not_starve_others():
+    executor = ProbeExecutor(max_concurrency=4, per_host_limit=1, queue_size=100)
+    loop = asyncio.get_running_loop()
+
+    async def slow():
+        await asyncio.sleep(0.2)
+
+    async def started_at():
+        return loop.time()
+
+    backlog = [asyncio.create_task(executor.submit("a", slow)) for _ in range(4)]
+    await asyncio.sleep(0.01)
+
+    submitted_at = loop.time()
+    other = await executor.submit("b", started_at)
+
+    # "b" runs on a free worker instead of queueing behind host "a"
+    assert other - submitted_at < 0.1
+    await asyncio.gather(*backlog)
+    assert executor.stats()["queue_depth"] == 0
+    await executor.aclose()
+
+
+@pytest.mark.asyncio
+async def test_executor_applies_backpressure():
+    executor = ProbeExecutor(max_concurrency=1, per_host_limit=1, queue_size=1)
+    release = asyncio.Event()
+
+    async def blocked():
+        await release.wait()
+
+    submitted = [asyncio.create_task(executor.submit("a", blocked)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+
+    # One probe running, one queued, the third submitter is waiting to enqueue
+    assert executor.stats()["in_flight"] == 1
+    assert executor.stats()["queue_depth"] == 1
+    assert not any(t.done() for t in submitted)
+
+    release.set()
+    await asyncio.gather(*submitted)
+    assert executor.stats()["max_wait_seconds"] > 0
+    await executor.aclose()
+
+
+@pytest.mark.asyncio
+async def test_executor_propagates_probe_errors():
+    executor = ProbeExecutor(max_concurrency=1)
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await executor.submit("a", failing)
+    await executor.aclose()
+
+
+# -------------------- Event transport --------------------
+
+@pytest.mark.asyncio
+async def test_publisher_does_not_wait_until_flush():
+    client = MagicMock()
+    futures = [Future(), Future()]
+    client.publish.side_effect = futures
+    publisher = PubSubTransport("projects/test/topics/incidents", client)
+
+    publisher.publish("CREATE_INCIDENT", 1, 10)
+    publisher.publish("RESOLVE_INCIDENT", 2, 11)
+
+    futures[0].set_result("id-1")
+    futures[1].set_exception(RuntimeError("unavailable"))
+    assert await publisher.flush() == 1
+    assert await publisher.flush() == 0
+    assert client.publish.call_count == 2
+    publisher.close()
+
+
+@pytest.mark.asyncio
+async def test_publisher_flow_control_does_not_block_event_loop():
+    unblocked = threading.Event()
+    delivered = Future()
+    delivered.set_result("id-1")
+    client = MagicMock()
+    # Flow control limit reached: publish blocks until messages drain
+    client.publish.side_effect = lambda topic, data: unblocked.wait(5) and delivered
+    publisher = PubSubTransport("projects/test/topics/incidents", client)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    publisher.publish("CREATE_INCIDENT", 1, 10)
+    await asyncio.sleep(0.05)
+    assert loop.time() - started < 1
+
+    unblocked.set()
+    assert await publisher.flush() == 1
+    publisher.close()
+
+
+@pytest.mark.asyncio
+async def test_engine_flushes_publishes_once_per_cycle(engine, service):
+    transitions = [
+        {"type": "CREATE_INCIDENT", "service_id": 1, "incident_id": 7},
+        {"type": "RESOLVE_INCIDENT", "service_id": 2, "incident_id": 8},
+    ]
+
+    with patch.object(engine, "fetch_recent_failure_counts", return_value={}), \
+         patch.object(IPStatusCollector, "_perform_check", return_value=True), \
+         patch.object(engine, "submit_results", return_value=transitions), \
+         patch.object(engine.publisher, "flush", new_callable=AsyncMock) as mock_flush:
+        await engine.process([service])
+
+    mock_flush.assert_awaited_once()
+    await engine.aclose()
+    assert engine.publisher.client.publish.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_queue_transport_delivers_engine_events_in_process(service):
+    transport = QueueTransport()
+    with patch("utils.transport.pubsub_v1.PublisherClient"):
+        engine = MonitoringEngine(api_base_url="http://api", pubsub_topic=None, transport=transport)
+
+    transitions = [{"type": "CREATE_INCIDENT", "service_id": 1, "incident_id": 7}]
+    with patch.object(engine, "fetch_recent_failure_counts", return_value={}), \
+         patch.object(IPStatusCollector, "_perform_check", return_value=False), \
+         patch.object(engine, "submit_results", return_value=transitions):
+        await engine.process([service])
+
+    received = []
+    stop = asyncio.Event()
+    stop.set()
+    await transport.consume(received.append, stop)
+
+    assert [(e["type"], e["incident_id"]) for e in received] == [("CREATE_INCIDENT", 7)]
+    await engine.aclose()
+
+
+@pytest.mark.asyncio
+async def test_queue_transport_flush_waits_for_consumer_when_full():
+    transport = QueueTransport(maxsize=2)
+    for incident_id in range(3):
+        transport.publish("CREATE_INCIDENT", 1, incident_id)
+    assert transport.queue.qsize() == 2
+
+    flush = asyncio.create_task(transport.flush())
+    await asyncio.sleep(0.01)
+    assert not flush.done()
+
+    received = []
+    stop = asyncio.Event()
+    stop.set()
+    consumer = asyncio.create_task(transport.consume(received.append, stop))
+    assert await flush == 3
+    await consumer
+    assert [e["incident_id"] for e in received] == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_local_runner_hands_monitoring_events_to_notification():
+    transport = QueueTransport()
+    monitoring = MagicMock()
+
+    async def monitor():
+        transport.publish("CREATE_INCIDENT", 1, 7)
+        transport.publish("RESOLVE_INCIDENT", 1, 7)
+        await transport.flush()
+
+    monitoring.run = monitor
+    notification = MagicMock()
+
+    await asyncio.wait_for(local_runner.run(monitoring, notification, transport), 5)
+
+    handled = [call.args[0]["type"] for call in notification.handle_event.call_args_list]
+    assert handled == ["CREATE_INCIDENT", "RESOLVE_INCIDENT"]
+
+
+def test_consumer_rejects_queue_transport(monkeypatch):
+    monkeypatch.setattr(consumer, "EVENT_TRANSPORT", "queue")
+    with pytest.raises(SystemExit):
+        consumer.main()
+
+
+@pytest.mark.asyncio
+async def test_file_transport_round_trip(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    producer = FileTransport(path)
+    producer.publish("CREATE_INCIDENT", 1, 10)
+    producer.publish("RESOLVE_INCIDENT", 1, 10)
+    assert await producer.flush() == 2
+    producer.close()
+
+    received = []
+    stop = asyncio.Event()
+    stop.set()
+    await FileTransport(path).consume(received.append, stop, offset=0)
+
+    assert [e["type"] for e in received] == ["CREATE_INCIDENT", "RESOLVE_INCIDENT"]
@@ -1,9 +1,20 @@
+import time
+import smtplib
+import threading
 import pytest
+import requests
+from concurrent.futures import Future
 from unittest.mock import MagicMock
 from flask import Flask
+from google.api_core.exceptions import AlreadyExists
 
 from utils.models import Admin, Incident, ContactAttempt
 from notification_module.notification_engine import NotificationEngine
+from notification_module.consumer import PullSubscriber, group_events
+from notification_module.mailer import Mailer, _Connection
+from notification_module.api_client import NotificationApiClient, TTLCache
+from utils.transport import encode_event
+from utils.http import create_session
 from tests.conftest import make_ack_token
 
 # -----------------------------
@@ -114,3 +125,350 @@ def test_notification_engine_logic(mock_mailer, mock_tasks_client):
     created_task = kwargs['task']
     # Check that the URL in the task contains the test host
     assert "https://test-host/escalate" == created_task['http_request']['url']
+
+
+def test_escalation_url_from_config_without_request(mock_mailer, mock_tasks_client, monkeypatch):
+    monkeypatch.setenv("SERVICE_URL", "http://localhost:8080")
+    api = MagicMock()
+    api.get_admins_by_incident.return_value = [{'id': 1, 'contact_value': "test@example.com"}]
+    api.get_service_name.return_value = None
+
+    engine = NotificationEngine(api=api, mailer=mock_mailer, esc_delay_seconds=1)
+    engine.handle_event({"type": "CREATE_INCIDENT", "incident_id": 123})
+
+    created_task = mock_tasks_client.create_task.call_args.kwargs['task']
+    assert created_task['http_request']['url'] == "http://localhost:8080/escalate"
+
+
+# -----------------------------
+# Pull subscriber
+# -----------------------------
+
+def _received(ack_id, event_type, incident_id):
+    msg = MagicMock()
+    msg.ack_id = ack_id
+    msg.message.data = encode_event(event_type, 1, incident_id)
+    return msg
+
+
+def test_group_events_by_incident_and_drop_duplicates():
+    events = [
+        ("a", {"type": "CREATE_INCIDENT", "incident_id": 1}),
+        ("b", {"type": "CREATE_INCIDENT", "incident_id": 2}),
+        ("c", {"type": "CREATE_INCIDENT", "incident_id": 1}),
+        ("d", {"type": "RESOLVE_INCIDENT", "incident_id": 1}),
+    ]
+
+    groups = group_events(events)
+
+    assert [ack_ids for ack_ids, _ in groups] == [["a", "c", "d"], ["b"]]
+    assert [e["type"] for e in groups[0][1]] == ["CREATE_INCIDENT", "RESOLVE_INCIDENT"]
+
+
+def test_pull_subscriber_acks_in_bulk_and_nacks_failures():
+    client = MagicMock()
+    client.pull.return_value.received_messages = [
+        _received("a", "CREATE_INCIDENT", 1),
+        _received("b", "CREATE_INCIDENT", 2),
+        _received("c", "RESOLVE_INCIDENT", 1),
+    ]
+    engine = MagicMock()
+    engine.handle_event.side_effect = lambda e: e["incident_id"] == 2 and 1 / 0
+
+    subscriber = PullSubscriber(engine, "projects/test/subscriptions/incidents", client=client, workers=2)
+
+    assert subscriber.pull_once() == 3
+    assert engine.handle_event.call_count == 3
+    client.acknowledge.assert_called_once_with(
+        subscription="projects/test/subscriptions/incidents", ack_ids=["a", "c"]
+    )
+    client.modify_ack_deadline.assert_called_once_with(
+        subscription="projects/test/subscriptions/incidents", ack_ids=["b"], ack_deadline_seconds=0
+    )
+
+
+def test_pull_subscriber_extends_leases_while_processing():
+    client = MagicMock()
+    client.pull.return_value.received_messages = [
+        _received("a", "CREATE_INCIDENT", 1),
+        _received("b", "CREATE_INCIDENT", 2),
+    ]
+    engine = MagicMock()
+    engine.handle_event.side_effect = lambda e: time.sleep(0.2)
+
+    subscriber = PullSubscriber(
+        engine, "projects/test/subscriptions/incidents", client=client, ack_deadline=60, lease_interval=0.05
+    )
+    subscriber.pull_once()
+
+    extensions = client.modify_ack_deadline.call_args_list
+    assert extensions
+    assert all(c.kwargs["ack_deadline_seconds"] == 60 and c.kwargs["ack_ids"] == ["a", "b"] for c in extensions)
+    client.acknowledge.assert_called_once_with(subscription="projects/test/subscriptions/incidents", ack_ids=["a", "b"])
+
+
+def test_pull_subscriber_keeps_pulling_and_acks_digested_incidents_once_sent():
+    client = MagicMock()
+    client.pull.return_value.received_messages = [
+        _received("a", "CREATE_INCIDENT", 1),
+        _received("b", "CREATE_INCIDENT", 2),
+    ]
+    sent, failed = Future(), Future()
+    engine = MagicMock()
+    engine.handle_event.side_effect = lambda e: [sent] if e["incident_id"] == 1 else [failed]
+
+    subscriber = PullSubscriber(
+        engine, "projects/test/subscriptions/incidents", client=client, workers=2, lease_interval=0.05
+    )
+    assert subscriber.pull_once() == 2
+
+    # The digest window is still open: the next batch is pulled meanwhile
+    client.pull.return_value.received_messages = [_received("c", "CREATE_INCIDENT", 3)]
+    engine.handle_event.side_effect = lambda e: []
+    assert subscriber.pull_once() == 1
+    client.acknowledge.assert_called_once_with(subscription="projects/test/subscriptions/incidents", ack_ids=["c"])
+
+    time.sleep(0.2)
+    extensions = [c.kwargs for c in client.modify_ack_deadline.call_args_list]
+    assert extensions and all({"a", "b"} <= set(c["ack_ids"]) for c in extensions)
+
+    sent.set_result(None)
+    failed.set_exception(RuntimeError("smtp down"))
+
+    client.acknowledge.assert_called_with(subscription="projects/test/subscriptions/incidents", ack_ids=["a"])
+    client.modify_ack_deadline.assert_any_call(
+        subscription="projects/test/subscriptions/incidents", ack_ids=["b"], ack_deadline_seconds=0
+    )
+    assert subscriber._held == {}
+
+
+def test_notification_engine_notifies_admins_concurrently(mock_tasks_client):
+    admins = [{'id': i, 'contact_value': f"admin{i}@example.com"} for i in range(3)]
+    api = MagicMock()
+    api.get_admins_by_incident.return_value = admins
+    api.get_service_name.return_value = "web"
+
+    # Every send waits until all three are in flight; a serial loop would time out
+    barrier = threading.Barrier(len(admins), timeout=5)
+    mailer = MagicMock()
+    mailer.send.side_effect = lambda **kwargs: barrier.wait() is not None
+
+    engine = NotificationEngine(api=api, mailer=mailer, esc_delay_seconds=1, max_workers=3)
+    app = Flask(__name__)
+    with app.test_request_context(base_url="https://test-host"):
+        engine.handle_event({"type": "CREATE_INCIDENT", "incident_id": 123})
+
+    assert mailer.send.call_count == 3
+    api.get_service_name.assert_called_once_with(123)
+    assert api.add_contact_attempt.call_count == 3
+    assert all(
+        c.kwargs['task']['http_request']['url'] == "https://test-host/escalate"
+        for c in mock_tasks_client.create_task.call_args_list
+    )
+
+
+# -----------------------------
+# Mailer
+# -----------------------------
+
+def test_mailer_reuses_pooled_connection(monkeypatch):
+    smtp = MagicMock()
+    monkeypatch.setattr("notification_module.mailer.smtplib.SMTP", smtp)
+    mailer = Mailer(host="smtp", port=587, username="u", password="p", sender="alerts@example.com")
+
+    assert mailer.send("a@example.com", "s", "b") is True
+    assert mailer.send_many([("b@example.com", "s", "b"), ("c@example.com", "s", "b")]) == [True, True]
+
+    smtp.assert_called_once()
+    smtp.return_value.login.assert_called_once_with("u", "p")
+    assert smtp.return_value.send_message.call_count == 3
+
+
+def test_mailer_reconnects_when_connection_dropped(monkeypatch):
+    stale, fresh = MagicMock(), MagicMock()
+    monkeypatch.setattr("notification_module.mailer.smtplib.SMTP", MagicMock(side_effect=[stale, fresh]))
+    mailer = Mailer(host="smtp", port=587, username="u", password="p", sender="alerts@example.com")
+
+    assert mailer.send("a@example.com", "s", "b") is True
+    stale.send_message.side_effect = smtplib.SMTPServerDisconnected("gone")
+
+    assert mailer.send("b@example.com", "s", "b") is True
+    fresh.send_message.assert_called_once()
+
+
+def test_mailer_retries_on_new_connection_when_idle_ones_are_stale(monkeypatch):
+    fresh = MagicMock()
+    smtp = MagicMock(return_value=fresh)
+    monkeypatch.setattr("notification_module.mailer.smtplib.SMTP", smtp)
+    mailer = Mailer(host="smtp", port=587, username="u", password="p", sender="alerts@example.com")
+
+    # The server timed out every idle connection at once
+    stale = [MagicMock(), MagicMock()]
+    for server in stale:
+        server.send_message.side_effect = smtplib.SMTPServerDisconnected("gone")
+        mailer._idle.put(_Connection(server))
+
+    assert mailer.send("a@example.com", "s", "b") is True
+    smtp.assert_called_once()
+    fresh.send_message.assert_called_once()
+
+
+def test_mailer_keeps_connection_after_rejected_message(monkeypatch):
+    smtp = MagicMock()
+    smtp.return_value.send_message.side_effect = [smtplib.SMTPRecipientsRefused({}), None]
+    monkeypatch.setattr("notification_module.mailer.smtplib.SMTP", smtp)
+    mailer = Mailer(host="smtp", port=587, username="u", password="p", sender="alerts@example.com")
+
+    assert mailer.send_many([("bad@example.com", "s", "b"), ("a@example.com", "s", "b")]) == [False, True]
+    smtp.assert_called_once()
+
+
+def test_mailer_reports_failure_when_server_unreachable(monkeypatch):
+    smtp = MagicMock(side_effect=ConnectionRefusedError("refused"))
+    monkeypatch.setattr("notification_module.mailer.smtplib.SMTP", smtp)
+    mailer = Mailer(host="smtp", port=587, username="u", password="p", sender="alerts@example.com")
+
+    assert mailer.send("a@example.com", "s", "b") is False
+    smtp.assert_called_once()
+
+
+def test_digest_coalesces_incidents_per_admin(mock_mailer, mock_tasks_client, monkeypatch):
+    monkeypatch.setenv("SERVICE_URL", "http://localhost:8080")
+    api = MagicMock()
+    api.get_admins_by_incident.return_value = [{'id': 1, 'contact_value': "test@example.com"}]
+    api.get_service_name.side_effect = ["web", "db", "db"]
+
+    engine = NotificationEngine(api=api, mailer=mock_mailer, esc_delay_seconds=1, digest_window=60)
+    [sent] = engine.handle_event({"type": "CREATE_INCIDENT", "incident_id": 1})
+    engine.handle_event({"type": "CREATE_INCIDENT", "incident_id": 2})
+    # A redelivered event is not listed twice
+    assert engine.handle_event({"type": "CREATE_INCIDENT", "incident_id": 2}) == [sent]
+    mock_mailer.send.assert_not_called()
+    assert not sent.done()
+
+    engine.flush_digests()
+
+    assert sent.result() is None
+    mock_mailer.send.assert_called_once()
+    body = mock_mailer.send.call_args.kwargs['body']
+    assert "web is DOWN" in body and "db is DOWN" in body
+    assert [c.args[0]["incident_id"] for c in api.add_contact_attempt.call_args_list] == [1, 2]
+    assert mock_tasks_client.create_task.call_count == 2
+
+
+# -----------------------------
+# API client cache
+# -----------------------------
+
+def _context_response(status="registered"):
+    resp = MagicMock(status_code=200)
+    resp.json.return_value = {
+        "incident": {"id": 1, "service_id": 1, "status": status},
+        "service": {"id": 1, "name": "web"},
+        "admins": {"primary": [{"id": 1}], "secondary": [{"id": 2}]},
+    }
+    return resp
+
+
+def test_api_client_serves_event_lookups_from_one_request():
+    get = MagicMock(return_value=_context_response())
+    api = NotificationApiClient("http://localhost:8000", session=MagicMock(get=get))
+
+    assert api.get_admins_by_incident(1, role="primary") == [{"id": 1}]
+    assert api.get_service_name(1) == "web"
+    assert api.get_admins_by_incident(1, role="secondary") == [{"id": 2}]
+    get.assert_called_once()
+
+    api.invalidate(1)
+    api.get_service_name(1)
+    assert get.call_count == 2
+
+
+def test_api_client_rechecks_status_for_acknowledgement():
+    get = MagicMock(side_effect=[_context_response(), _context_response("acknowledged")])
+    api = NotificationApiClient("http://localhost:8000", session=MagicMock(get=get))
+
+    assert api.get_service_name(1) == "web"
+    assert api.is_acknowledged(1) is True
+    assert get.call_count == 2
+
+
+def test_api_client_raises_on_server_errors():
+    error = MagicMock(status_code=503)
+    error.raise_for_status.side_effect = requests.HTTPError("503")
+    get = MagicMock(side_effect=[error, _context_response()])
+    api = NotificationApiClient("http://localhost:8000", session=MagicMock(get=get))
+
+    with pytest.raises(requests.HTTPError):
+        api.is_acknowledged(1)
+    assert api.get_service_name(1) == "web"
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    cache.ttl = 0
+    cache.set("d", 4)
+    assert cache.get("d") is None
+
+
+def test_http_session_pools_retries_and_times_out(monkeypatch):
+    session = create_session(pool_maxsize=8, retries=2)
+
+    adapter = session.get_adapter("https://api.example.com")
+    assert adapter._pool_maxsize == 8
+    assert adapter.max_retries.total == 2
+    assert 503 in adapter.max_retries.status_forcelist
+
+    sent = MagicMock()
+    monkeypatch.setattr("requests.Session.request", sent)
+    session.get("https://api.example.com/services")
+    assert sent.call_args.kwargs["timeout"] == session.timeout
+
+
+# -----------------------------
+# Escalation scheduling
+# -----------------------------
+
+def test_escalation_scheduled_once_per_incident(mock_mailer, mock_tasks_client, monkeypatch):
+    monkeypatch.setenv("SERVICE_URL", "http://localhost:8080")
+    mock_tasks_client.queue_path.return_value = "projects/p/locations/l/queues/q"
+    api = MagicMock()
+    api.get_admins_by_incident.return_value = [{'id': i, 'contact_value': f"a{i}@example.com"} for i in range(3)]
+
+    engine = NotificationEngine(api=api, mailer=mock_mailer, esc_delay_seconds=1)
+    engine.handle_event({"type": "CREATE_INCIDENT", "incident_id": 5})
+    engine.handle_event({"type": "CREATE_INCIDENT", "incident_id": 5})
+
+    assert mock_mailer.send.call_count == 6
+    mock_tasks_client.create_task.assert_called_once()
+    task = mock_tasks_client.create_task.call_args.kwargs['task']
+    assert task['name'] == "projects/p/locations/l/queues/q/tasks/escalation-5"
+
+    # Another instance already created the task: not an error
+    mock_tasks_client.create_task.side_effect = AlreadyExists("exists")
+    NotificationEngine(api=api, mailer=mock_mailer, esc_delay_seconds=1).handle_event(
+        {"type": "CREATE_INCIDENT", "incident_id": 5}
+    )
+    assert mock_tasks_client.create_task.call_count == 2
+
+
+def test_local_escalation_backend_runs_check_on_timer(mock_mailer):
+    api = MagicMock()
+    api.get_admins_by_incident.return_value = [{'id': 1, 'contact_value': "a@example.com"}]
+    api.is_acknowledged.return_value = True
+
+    engine = NotificationEngine(api=api, mailer=mock_mailer, esc_delay_seconds=0, escalation_backend="local")
+    checked = threading.Event()
+    engine.handle_escalation_check = lambda incident_id: checked.set()
+
+    engine.handle_event({"type": "CREATE_INCIDENT", "incident_id": 7})
+
+    assert engine.tasks_client is None
+    assert checked.wait(timeout=5)
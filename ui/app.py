@@ -3,10 +3,14 @@ import requests
 from datetime import datetime
 from flask import Flask, render_template, request, redirect, url_for, session, flash
 from utils.auth import get_headers
+from utils.http import get_session
 
 app = Flask(__name__)
 app.secret_key = 'dev_secret_key'  # Change for production
 
+# Pooled HTTP session for API calls (keep-alive, timeouts, retries)
+http = get_session()
+
 @app.template_filter('datetimeformat')
 def datetimeformat(value):
     if not value:
@@ -31,8 +35,19 @@ API_URL = os.environ.get("API_BASE_URL", "http://localhost:8000")
 def fetch_all_admins():
     """Fetch list of admins for login and dropdowns."""
     try:
-        resp = requests.get(f"{API_URL}/admins/", headers=get_headers(API_URL))
-        return resp.json() if resp.status_code == 200 else []
+        admins = []
+        params = {"limit": 1000}
+        while True:
+            resp = http.get(f"{API_URL}/admins/", params=params, headers=get_headers(API_URL))
+            if resp.status_code != 200:
+                return admins
+            admins.extend(resp.json())
+
+            # Follow the pagination cursor until the last page
+            cursor = resp.headers.get("X-Next-Cursor")
+            if not cursor:
+                return admins
+            params["cursor"] = cursor
     except Exception as e:
         print(f"Error loading admins: {e}")
         return []
@@ -50,7 +65,7 @@ def index():
 def login():
     email = request.form.get('email')
     
-    admin = requests.get(f"{API_URL}/admins/contact/{email}", headers=get_headers(API_URL))
+    admin = http.get(f"{API_URL}/admins/contact/{email}", headers=get_headers(API_URL))
     user = admin.json() if admin.status_code == 200 else None
 
     if user:
@@ -83,7 +98,7 @@ def register():
         }
         
         try:
-            resp = requests.post(f"{API_URL}/admins/", json=payload, headers=get_headers(API_URL))
+            resp = http.post(f"{API_URL}/admins/", json=payload, headers=get_headers(API_URL))
             print(resp.text)
             
             if resp.status_code == 200:
@@ -118,29 +133,11 @@ def dashboard():
     
     try:
         user_id = session['user_id']
-        resp = requests.get(f"{API_URL}/admins/{user_id}/services", headers=get_headers(API_URL))
-        
+        # Services with admins, recent incidents and contact attempts in one call
+        resp = http.get(f"{API_URL}/admins/{user_id}/dashboard", headers=get_headers(API_URL))
+
         if resp.status_code == 200:
             services = resp.json()
-            
-            for svc in services:
-
-                resp_admins = requests.get(f"{API_URL}/services/{svc['id']}/admins", headers=get_headers(API_URL))
-                if resp_admins.status_code == 200:
-                    svc.update(resp_admins.json())
-                else:
-                    svc.update({"primary": None, "secondary": None})
-                inc_resp = requests.get(f"{API_URL}/services/{svc['id']}/incidents", headers=get_headers(API_URL))
-                if inc_resp.status_code == 200:
-                    svc['incidents'] = inc_resp.json()
-                else:
-                    svc['incidents'] = []
-
-                att_resp = requests.get(f"{API_URL}/contact_attempts?service_id={svc['id']}", headers=get_headers(API_URL))
-                if att_resp.status_code == 200:
-                    svc['attempts'] = att_resp.json()
-                else:
-                    svc['attempts'] = []
 
     except requests.exceptions.RequestException:
         flash("Could not connect to backend to fetch data.", "warning")
@@ -163,7 +160,7 @@ def add_service():
             "failure_threshold": int(request.form.get('threshold'))  # new field
         }
 
-        resp = requests.post(f"{API_URL}/services", json=svc_payload, headers=get_headers(API_URL))
+        resp = http.post(f"{API_URL}/services", json=svc_payload, headers=get_headers(API_URL))
 
         if resp.status_code in [200, 201]:
             data = resp.json()
@@ -175,7 +172,7 @@ def add_service():
                 "role": "primary",
                 "admin_id": session['user_id']  # Using the updated endpoint
             }
-            resp_primary = requests.post(
+            resp_primary = http.post(
                 f"{API_URL}/services/{service_id}/admin",
                 json=primary_admin_payload,
                 headers=get_headers(API_URL)
@@ -192,7 +189,7 @@ def add_service():
                     "role": "secondary",
                     "admin_id": int(sec_admin_id)
                 }
-                resp_secondary = requests.post(
+                resp_secondary = http.post(
                     f"{API_URL}/services/{service_id}/admin",
                     json=secondary_admin_payload,
                     headers=get_headers(API_URL)
@@ -217,7 +214,7 @@ def edit_service(service_id):
         return redirect(url_for('index'))
 
     # 1. Fetch service details from API
-    resp_service = requests.get(f"{API_URL}/services/{service_id}", headers=get_headers(API_URL))
+    resp_service = http.get(f"{API_URL}/services/{service_id}", headers=get_headers(API_URL))
     if resp_service.status_code != 200:
         flash(f"Service not found: {resp_service.text}", "danger")
         return redirect(url_for('dashboard'))
@@ -226,7 +223,7 @@ def edit_service(service_id):
     # 2. Fetch current admins for the service
     current_admins = {"primary": None, "secondary": None} # default values
     try:
-        resp_admins = requests.get(f"{API_URL}/services/{service_id}/admins", headers=get_headers(API_URL))
+        resp_admins = http.get(f"{API_URL}/services/{service_id}/admins", headers=get_headers(API_URL))
         if resp_admins.status_code == 200:
             data = resp_admins.json()
             current_admins["primary"] = data.get("primary")
@@ -252,7 +249,7 @@ def edit_service(service_id):
             "alerting_window_npings": int(request.form.get('alerting_window_npings')),
             "failure_threshold": int(request.form.get('failure_threshold'))
         }
-        resp_update_service = requests.put(
+        resp_update_service = http.put(
             f"{API_URL}/services/{service_id}",
             json=svc_payload,
             headers=get_headers(API_URL)
@@ -271,7 +268,7 @@ def edit_service(service_id):
                 "role": "primary",
                 "new_admin_id": int(primary_admin_id)
             }
-            resp_admin = requests.put(f"{API_URL}/services/{service_id}/admin", json=payload, headers=get_headers(API_URL))
+            resp_admin = http.put(f"{API_URL}/services/{service_id}/admin", json=payload, headers=get_headers(API_URL))
             if resp_admin.status_code not in [200, 201]:
                 flash(f"Failed to update primary admin: {resp_admin.text}", "danger")
                 return redirect(url_for('edit_service', service_id=service_id))
@@ -283,14 +280,14 @@ def edit_service(service_id):
                     "role": "secondary",
                     "new_admin_id": int(secondary_admin_id)
                 }
-                resp_admin = requests.put(f"{API_URL}/services/{service_id}/admin", json=payload, headers=get_headers(API_URL))
+                resp_admin = http.put(f"{API_URL}/services/{service_id}/admin", json=payload, headers=get_headers(API_URL))
             else:  # secondary admin didn't exist: create one
                 payload = {
                     "service_id": service_id, 
                     "role": "secondary", 
                     "admin_id": int(secondary_admin_id)
                 }
-                resp_admin = requests.post(f"{API_URL}/services/{service_id}/admin", json=payload, headers=get_headers(API_URL))
+                resp_admin = http.post(f"{API_URL}/services/{service_id}/admin", json=payload, headers=get_headers(API_URL))
 
             if resp_admin.status_code not in [200, 201]:
                 flash(f"Failed to update secondary admin: {resp_admin.text}", "danger")
@@ -314,7 +311,7 @@ def delete_service(service_id):
         return redirect(url_for('index'))
     
     try:
-        resp = requests.delete(f"{API_URL}/services/{service_id}", headers=get_headers(API_URL))
+        resp = http.delete(f"{API_URL}/services/{service_id}", headers=get_headers(API_URL))
         
         if resp.status_code == 200:
             flash("Service successfully deleted.", "success")
@@ -337,7 +334,7 @@ def profile():
     if request.method == 'POST':
         # Update contact method
         new_email = request.form.get('email')
-        resp = requests.patch(
+        resp = http.patch(
             f"{API_URL}/admins/{session['user_id']}",
             json={"contact_value": new_email, "contact_type": "email"},
             headers=get_headers(API_URL)
@@ -371,7 +368,7 @@ def acknowledge_incident():
         try:
             # Send the token to the private API to confirm the incident
             payload = {"token": token}
-            resp = requests.post(
+            resp = http.post(
                 f"{API_URL}/incidents/ack", 
                 json=payload, 
                 headers=get_headers(API_URL)
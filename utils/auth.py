@@ -1,20 +1,29 @@
+import time
+import asyncio
+import threading
 import requests
-import httpx
+import jwt
 
 METADATA_URL = "http://metadata.google.internal/computeMetadata/v1/instance/service-accounts/default/identity"
 META_HEADERS = {"Metadata-Flavor": "Google"}
 
+# Tokens are refreshed in the background this many seconds before they expire
+REFRESH_MARGIN = 300
+# Lifetime assumed for tokens whose `exp` claim cannot be read
+DEFAULT_TOKEN_TTL = 600
+# After a failed background refresh the next one waits this many seconds
+REFRESH_RETRY_AFTER = 30
+
 def _is_local(url: str) -> bool:
     """
     Checks if the service is working locally.
     """
     return "localhost" in url or "127.0.0.1" in url or "0.0.0.0" in url
 
-# --- Version for Flask ---
-def get_headers(target_audience: str) -> dict:
-    if _is_local(target_audience):
-        return {"Content-Type": "application/json"}
-
+def _fetch_token(target_audience: str) -> str | None:
+    """
+    Requests an OIDC identity token for the audience from the Metadata Server.
+    """
     try:
         resp = requests.get(
             METADATA_URL, 
@@ -23,34 +32,127 @@ def get_headers(target_audience: str) -> dict:
             timeout=2
         )
         if resp.status_code == 200:
-            return {"Authorization": f"Bearer {resp.text.strip()}"}
+            return resp.text.strip()
         else:
-            print(f"[Auth Sync] Error: {resp.status_code} {resp.text}")
+            print(f"[Auth] Error: {resp.status_code} {resp.text}")
     except Exception as e:
-        print(f"[Auth Sync] Exception: {e}")
-    
-    return {}
+        print(f"[Auth] Exception: {e}")
+
+    return None
+
+def _token_expiry(token: str) -> float:
+    try:
+        return float(jwt.decode(token, options={"verify_signature": False})["exp"])
+    except Exception:
+        return time.time() + DEFAULT_TOKEN_TTL
+
+
+class TokenCache:
+    """
+    Identity tokens cached per audience until shortly before they expire.
+
+    Safe to share between threads and coroutines: concurrent callers that miss
+    the cache wait for a single fetch (single-flight), and tokens close to
+    expiry are refreshed in a background thread while the cached one is
+    still served. A failed refresh is retried after `retry_after` seconds,
+    until the cached token actually expires.
+    """
+
+    def __init__(self, fetch=_fetch_token, refresh_margin: float = REFRESH_MARGIN,
+                 retry_after: float = REFRESH_RETRY_AFTER):
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.retry_after = retry_after
+        self._tokens = {}  # audience -> (token, expires_at)
+        self._locks = {}
+        self._refreshing = set()
+        self._retry_at = {}  # audience -> earliest next background refresh
+        self._lock = threading.Lock()
+
+    def peek(self, audience: str) -> str | None:
+        """
+        Returns the cached token if it is still valid, without blocking.
+        """
+        cached = self._tokens.get(audience)
+        if not cached:
+            return None
+
+        token, expires_at = cached
+        now = time.time()
+        if now >= expires_at:
+            return None
+        if now >= expires_at - self.refresh_margin and now >= self._retry_at.get(audience, 0):
+            self._refresh_in_background(audience)
+        return token
+
+    def get(self, audience: str) -> str | None:
+        token = self.peek(audience)
+        if token:
+            return token
+
+        with self._audience_lock(audience):
+            # Another caller may have fetched it while we were waiting
+            cached = self._tokens.get(audience)
+            if cached and time.time() < cached[1]:
+                return cached[0]
+            return self._refresh(audience)
+
+    def clear(self):
+        self._tokens.clear()
+
+    def _audience_lock(self, audience: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(audience, threading.Lock())
+
+    def _refresh(self, audience: str) -> str | None:
+        token = self._fetch(audience)
+        if token:
+            self._tokens[audience] = (token, _token_expiry(token))
+        return token
+
+    def _refresh_in_background(self, audience: str):
+        with self._lock:
+            if audience in self._refreshing:
+                return
+            self._refreshing.add(audience)
+
+        def refresh():
+            try:
+                with self._audience_lock(audience):
+                    token = self._refresh(audience)
+                if token:
+                    self._retry_at.pop(audience, None)
+                else:
+                    self._retry_at[audience] = time.time() + self.retry_after
+            finally:
+                with self._lock:
+                    self._refreshing.discard(audience)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+_token_cache = TokenCache()
+
+def _auth_headers(token: str | None) -> dict:
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+# --- Version for Flask ---
+def get_headers(target_audience: str) -> dict:
+    if _is_local(target_audience):
+        return {"Content-Type": "application/json"}
+
+    return _auth_headers(_token_cache.get(target_audience))
 
 # --- Version for Asyncio ---
 async def get_headers_async(target_audience: str) -> dict:
     if _is_local(target_audience):
         return {"Content-Type": "application/json"}
 
-    try:
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            resp = await client.get(
-                METADATA_URL, 
-                params={"audience": target_audience}, 
-                headers=META_HEADERS
-            )
-            if resp.status_code == 200:
-                return {"Authorization": f"Bearer {resp.text.strip()}"}
-            else:
-                print(f"[Auth Async] Error: {resp.status_code} {resp.text}")
-    except Exception as e:
-        print(f"[Auth Async] Exception: {e}")
-
-    return {}
+    # Fast path never leaves the event loop; a miss fetches in a worker thread
+    token = _token_cache.peek(target_audience)
+    if token is None:
+        token = await asyncio.to_thread(_token_cache.get, target_audience)
+    return _auth_headers(token)
 
 
 # API_URL = os.environ.get("API_BASE_URL", "http://localhost:8000")
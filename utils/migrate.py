@@ -0,0 +1,21 @@
+import os
+from sqlalchemy import create_engine
+from utils.models import Base, ensure_indexes
+
+
+def main():
+    """
+    One-off schema migration: creates missing tables, then indexes added to
+    the models after the tables were created. Run it as a job before rolling
+    out an API version that declares new indexes.
+    """
+    engine = create_engine(os.environ["db_url"])
+    try:
+        Base.metadata.create_all(bind=engine)
+        ensure_indexes(engine)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
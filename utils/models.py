@@ -1,8 +1,9 @@
 from sqlalchemy import (
-    Column, Integer, String, DateTime, ForeignKey, CheckConstraint, func
+    Column, Integer, String, DateTime, ForeignKey, CheckConstraint, Index, func, text
 )
 from datetime import datetime, timezone, timedelta
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.schema import CreateIndex
 
 Base = declarative_base()
 
@@ -20,6 +21,7 @@ class Service(Base):
         DateTime,
         nullable=False,
         default=datetime.now(timezone.utc) + timedelta(seconds=60),
+        index=True,
     )
 
     # Cascade delete incidents and service_admins when service is deleted
@@ -102,6 +104,15 @@ class Incident(Base):
 
     __table_args__ = (
         CheckConstraint("status IN ('registered', 'acknowledged', 'resolved')"),
+        # Partial index: only open incidents are looked up on the hot path
+        Index(
+            "ix_incidents_open_service_id",
+            "service_id",
+            postgresql_where=text("status IN ('registered', 'acknowledged')"),
+            sqlite_where=text("status IN ('registered', 'acknowledged')"),
+        ),
+        # Paginated incident history per service, newest first
+        Index("ix_incidents_service_id_started_at", "service_id", "started_at"),
     )
 
     service = relationship("Service", back_populates="incidents")
@@ -125,6 +136,18 @@ class ContactAttempt(Base):
     result = Column(String)
     response_at = Column(DateTime)
 
+    __table_args__ = (
+        # Latest attempt per (incident, admin), used when acknowledging
+        Index(
+            "ix_contact_attempts_incident_admin_attempted_at",
+            "incident_id",
+            "admin_id",
+            attempted_at.desc(),
+        ),
+        # Paginated contact attempt history, newest first
+        Index("ix_contact_attempts_attempted_at", "attempted_at"),
+    )
+
     incident = relationship("Incident", back_populates="contact_attempts")
     admin = relationship("Admin", back_populates="contact_attempts")
 
@@ -133,7 +156,69 @@ class PingFailure(Base):
     __tablename__ = "ping_failures"
 
     id = Column(Integer, primary_key=True)
-    service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), index=True)
+    service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"))
     failed_at = Column(DateTime(timezone=True), index=True, default=lambda: datetime.now(timezone.utc))
 
+    __table_args__ = (
+        # Serves the per-service failure window counts
+        Index("ix_ping_failures_service_id_failed_at", "service_id", "failed_at"),
+    )
+
     service = relationship("Service", back_populates="ping_failures")
+
+
+class TableVersion(Base):
+    """
+    Change counter per table, bumped on every ORM write to a versioned table.
+    Used to derive ETags for read-mostly API endpoints.
+    """
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True))
+
+
+def ensure_indexes(engine):
+    """
+    Creates any index declared on the models that is missing from the database.
+
+    `Base.metadata.create_all` only creates missing tables, so databases created
+    before an index was added to the models are brought up to date here. Meant
+    to run as a one-off migration (`python -m utils.migrate`), not at startup:
+    on PostgreSQL indexes are built CONCURRENTLY, which does not block writes
+    but can take a while on large tables. Indexes left invalid by an
+    interrupted build are dropped and rebuilt.
+    """
+    postgres = engine.dialect.name == "postgresql"
+    failed = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        invalid = set()
+        if postgres:
+            invalid = set(conn.execute(text(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE NOT i.indisvalid"
+            )).scalars())
+
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    if index.name in invalid:
+                        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                    _create_index(conn, index, concurrently=postgres)
+                except Exception as e:
+                    print(f"Failed to create index {index.name}: {e}")
+                    failed.append(index.name)
+
+    if failed:
+        raise RuntimeError(f"Indexes not created: {', '.join(failed)}")
+
+
+def _create_index(conn, index: Index, concurrently: bool):
+    options = index.dialect_options["postgresql"]
+    declared = options["concurrently"]
+    options["concurrently"] = concurrently
+    try:
+        conn.execute(CreateIndex(index, if_not_exists=True))
+    finally:
+        options["concurrently"] = declared
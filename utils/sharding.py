@@ -0,0 +1,51 @@
+import bisect
+import hashlib
+from functools import lru_cache
+
+# Points placed on the ring per shard; more points give a more even split
+VIRTUAL_NODES = 64
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring assigning services to monitoring shards.
+
+    Each shard owns the arcs of the ring ending at its virtual nodes. When the
+    shard count changes only about 1/N of the services move to another shard,
+    so the remaining workers keep their services (and in-memory state).
+    """
+
+    def __init__(self, shard_count: int, virtual_nodes: int = VIRTUAL_NODES):
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+
+        points = sorted(
+            (_hash(f"shard-{shard}-{node}"), shard)
+            for shard in range(shard_count)
+            for node in range(virtual_nodes)
+        )
+        self.shard_count = shard_count
+        self._hashes = [h for h, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, service_id: int) -> int:
+        i = bisect.bisect(self._hashes, _hash(str(service_id))) % len(self._hashes)
+        return self._shards[i]
+
+
+@lru_cache(maxsize=16)
+def get_ring(shard_count: int) -> HashRing:
+    return HashRing(shard_count)
+
+
+def owns(service_id: int, shard_index: int, shard_count: int) -> bool:
+    """
+    Returns True if the given shard is responsible for the service.
+    """
+    if shard_count <= 1:
+        return True
+    return get_ring(shard_count).shard_for(service_id) == shard_index
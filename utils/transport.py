@@ -0,0 +1,275 @@
+import os
+import time
+import json
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1.types import (
+    BatchSettings, PublisherOptions, PublishFlowControl, LimitExceededBehavior
+)
+
+# Which transport carries incident events from monitoring to notification:
+# "pubsub" (production), "queue" (in-process asyncio queue, only usable with
+# notification_module.local_runner) or "file" (JSON lines appended to a local
+# file, shared by processes on one machine).
+EVENT_TRANSPORT = os.environ.get("EVENT_TRANSPORT", "pubsub")
+# Events the in-process queue holds before the producer's flush waits for the consumer
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", 10000))
+EVENT_FILE_PATH = os.environ.get("EVENT_FILE_PATH", "/tmp/alerting-events.jsonl")
+EVENT_FILE_POLL_INTERVAL = float(os.environ.get("EVENT_FILE_POLL_INTERVAL", 0.1))
+
+# Pub/Sub batching: a batch is sent when any of these limits is reached
+PUBSUB_BATCH_MAX_MESSAGES = int(os.environ.get("PUBSUB_BATCH_MAX_MESSAGES", 100))
+PUBSUB_BATCH_MAX_BYTES = int(os.environ.get("PUBSUB_BATCH_MAX_BYTES", 1024 * 1024))
+PUBSUB_BATCH_MAX_LATENCY = float(os.environ.get("PUBSUB_BATCH_MAX_LATENCY", 0.05))
+
+# Pub/Sub flow control: publishing blocks once this many messages/bytes are outstanding
+PUBSUB_FLOW_MAX_MESSAGES = int(os.environ.get("PUBSUB_FLOW_MAX_MESSAGES", 1000))
+PUBSUB_FLOW_MAX_BYTES = int(os.environ.get("PUBSUB_FLOW_MAX_BYTES", 10 * 1024 * 1024))
+
+
+def encode_event(event_type: str, service_id: int, incident_id: int) -> bytes:
+    """
+    Serialises an incident lifecycle event into a message payload.
+    """
+    message = {
+        "type": event_type,
+        "service_id": service_id,
+        "incident_id": incident_id,
+        "timestamp": time.time(),
+    }
+    return json.dumps(message).encode("utf-8")
+
+
+def decode_event(data: bytes | str) -> dict:
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+class EventTransport(ABC):
+    """
+    Carries incident events from the monitoring engine to the notification
+    service.
+
+    Producers call `publish` (which must not block on delivery) and `flush`
+    once per cycle. Transports that can be read in-process are
+    ConsumableTransports.
+    """
+
+    @abstractmethod
+    def publish(self, event_type: str, service_id: int, incident_id: int):
+        ...
+
+    async def flush(self) -> int:
+        """
+        Waits until published events are delivered; returns how many were.
+        """
+        return 0
+
+    def close(self):
+        pass
+
+
+class ConsumableTransport(EventTransport):
+    """
+    An EventTransport whose events can be read back in-process.
+    """
+
+    @abstractmethod
+    async def consume(self, handler: Callable[[dict], None], stop: asyncio.Event | None = None):
+        """
+        Hands each event to `handler` until `stop` is set.
+        """
+
+
+class PubSubTransport(EventTransport):
+    """
+    Google Cloud Pub/Sub. Messages are batched and flow-controlled by the
+    client; `flush` awaits every pending publish future in one go. Delivery
+    to the notification service is by push subscription.
+
+    `client.publish` blocks while flow control is at its limit, so it runs
+    on a dedicated thread (one, to keep publish order) instead of the event
+    loop, which keeps probing during a mass outage.
+    """
+
+    def __init__(self, topic: str, client=None):
+        self.topic = topic
+        self.client = client or create_publisher()
+        self._pending = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pubsub-publish")
+
+    def publish(self, event_type: str, service_id: int, incident_id: int):
+        data = encode_event(event_type, service_id, incident_id)
+        self._pending.append(self._executor.submit(self.client.publish, self.topic, data))
+
+    async def flush(self) -> int:
+        pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        async def delivered(submitted):
+            # Resolves to the client's publish future, then to the message id
+            return await asyncio.wrap_future(await asyncio.wrap_future(submitted))
+
+        results = await asyncio.gather(
+            *(delivered(f) for f in pending),
+            return_exceptions=True
+        )
+        failed = [r for r in results if isinstance(r, Exception)]
+        for error in failed:
+            print(f"Pub/Sub publish failed: {error}")
+        return len(results) - len(failed)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class QueueTransport(ConsumableTransport):
+    """
+    In-process asyncio queue, for running monitoring and notification in a
+    single event loop (tests, benchmarks, single-node deployments).
+
+    The queue holds at most `maxsize` events. `publish` cannot wait, so events
+    beyond that are held back until `flush`, which waits for the consumer to
+    make room: a producer that outpaces the consumer is slowed down once per
+    cycle instead of growing the queue without bound.
+    """
+
+    def __init__(self, maxsize: int = EVENT_QUEUE_SIZE):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self._overflow = deque()
+        self._published = 0
+
+    def publish(self, event_type: str, service_id: int, incident_id: int):
+        event = decode_event(encode_event(event_type, service_id, incident_id))
+        if self._overflow or self.queue.full():
+            self._overflow.append(event)
+        else:
+            self.queue.put_nowait(event)
+        self._published += 1
+
+    async def flush(self) -> int:
+        while self._overflow:
+            await self.queue.put(self._overflow.popleft())
+        published, self._published = self._published, 0
+        return published
+
+    async def consume(self, handler: Callable[[dict], None], stop: asyncio.Event | None = None):
+        stop = stop or asyncio.Event()
+        while not (stop.is_set() and self.queue.empty()):
+            try:
+                event = await asyncio.wait_for(self.queue.get(), EVENT_FILE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                continue
+            try:
+                await _call(handler, event)
+            finally:
+                self.queue.task_done()
+
+
+class FileTransport(ConsumableTransport):
+    """
+    Append-only JSON lines file, for running monitoring and notification as
+    separate processes on one machine. The consumer tails the file from its
+    current end (or from `offset`).
+    """
+
+    def __init__(self, path: str = EVENT_FILE_PATH, poll_interval: float = EVENT_FILE_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._file = None
+        self._published = 0
+
+    def publish(self, event_type: str, service_id: int, incident_id: int):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(encode_event(event_type, service_id, incident_id) + b"\n")
+        self._published += 1
+
+    async def flush(self) -> int:
+        if self._file is not None:
+            self._file.flush()
+        published, self._published = self._published, 0
+        return published
+
+    async def consume(
+        self,
+        handler: Callable[[dict], None],
+        stop: asyncio.Event | None = None,
+        offset: int | None = None,
+    ):
+        stop = stop or asyncio.Event()
+        open(self.path, "ab").close()
+
+        with open(self.path, "rb") as f:
+            if offset is None:
+                f.seek(0, os.SEEK_END)
+            else:
+                f.seek(offset)
+            buffer = b""
+            while True:
+                chunk = f.read()
+                if not chunk:
+                    if stop.is_set():
+                        return
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        await _call(handler, decode_event(line))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def _call(handler: Callable[[dict], None], event: dict):
+    """
+    Runs a (possibly blocking) event handler without stalling the loop.
+    """
+    try:
+        if asyncio.iscoroutinefunction(handler):
+            await handler(event)
+        else:
+            await asyncio.to_thread(handler, event)
+    except Exception as e:
+        print(f"Failed to handle event {event}: {e}")
+
+
+def create_publisher() -> pubsub_v1.PublisherClient:
+    """
+    Builds a PublisherClient with the configured batch and flow control settings.
+    """
+    return pubsub_v1.PublisherClient(
+        batch_settings=BatchSettings(
+            max_messages=PUBSUB_BATCH_MAX_MESSAGES,
+            max_bytes=PUBSUB_BATCH_MAX_BYTES,
+            max_latency=PUBSUB_BATCH_MAX_LATENCY,
+        ),
+        publisher_options=PublisherOptions(
+            flow_control=PublishFlowControl(
+                message_limit=PUBSUB_FLOW_MAX_MESSAGES,
+                byte_limit=PUBSUB_FLOW_MAX_BYTES,
+                limit_exceeded_behavior=LimitExceededBehavior.BLOCK,
+            ),
+        ),
+    )
+
+
+def create_transport(kind: str = EVENT_TRANSPORT, topic: str | None = None, path: str = EVENT_FILE_PATH) -> EventTransport:
+    if kind == "pubsub":
+        return PubSubTransport(topic)
+    if kind == "queue":
+        return QueueTransport()
+    if kind == "file":
+        return FileTransport(path)
+    raise ValueError(f"Unknown event transport: {kind}")